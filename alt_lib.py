@@ -0,0 +1,177 @@
+# Imports
+import argparse
+import json
+import os
+import random
+import time
+from array import array
+from math import inf
+
+from ch_lib import graph_fingerprint
+from csr_lib import CSRGraph
+from search_lib import reverse_distances, search
+
+# ALT heuristic (A*, Landmarks, Triangle inequality)
+# For a landmark L the triangle inequality gives two lower bounds on d(v, t):
+#   d(L, t) - d(L, v)   and   d(v, L) - d(t, L)
+# The heuristic is the largest bound over the active landmarks. It is admissible and
+# consistent on road distance, unlike raw coordinate distances in NYC units.
+ALT_MAGIC = "CZALT"
+ALT_VERSION = 1
+ALT_NAME = "graph.alt"
+DEFAULT_ALT = os.path.join("data", ALT_NAME)
+DEFAULT_LANDMARKS = 16
+ACTIVE_LANDMARKS = 4
+
+
+# Forward/reverse landmark distance tables, flattened landmark-major
+class LandmarkTables:
+    def __init__(self, csr: CSRGraph, landmarks: 'list[int]', forward: array, reverse: array):
+        self.csr = csr
+        self.landmarks = landmarks
+        self.num_nodes = csr.num_nodes()
+        # forward[k * n + v] = d(landmark k, v), reverse[k * n + v] = d(v, landmark k)
+        self.forward = forward
+        self.reverse = reverse
+
+    # Distances from / to landmark k as (forward, reverse) views, without copying
+    def tables(self, k: int):
+        n = self.num_nodes
+        return memoryview(self.forward)[k * n:(k + 1) * n], memoryview(self.reverse)[k * n:(k + 1) * n]
+
+    # Landmarks giving the best bound between source and target
+    def active_landmarks(self, source: int, target: int, count: int = ACTIVE_LANDMARKS) -> 'list[int]':
+        n = self.num_nodes
+        bounds = []
+        for k in range(len(self.landmarks)):
+            bound = max(self.forward[k * n + target] - self.forward[k * n + source],
+                        self.reverse[k * n + source] - self.reverse[k * n + target])
+            if bound == bound and bound != inf:
+                bounds.append((bound, k))
+        bounds.sort(reverse=True)
+        return [k for _, k in bounds[:count]]
+
+    # Lower bound on d(v, target) as a node -> estimate callable
+    # backward=True bounds d(target, v) instead, for the reverse side of a bidirectional search
+    # source picks the active landmarks for the query, otherwise all of them are used
+    def heuristic(self, target: int, source: int = None, multiplier: float = 1., backward: bool = False,
+                  active: int = ACTIVE_LANDMARKS):
+        if source is None:
+            chosen = range(len(self.landmarks))
+        elif backward:
+            chosen = self.active_landmarks(target, source, active)
+        else:
+            chosen = self.active_landmarks(source, target, active)
+
+        # Each bound is constant + sign * table[v]
+        terms = []
+        for k in chosen:
+            forward, reverse = self.tables(k)
+            if backward:
+                # d(target, v) >= d(L, v) - d(L, target) and d(target, L) - d(v, L)
+                terms.append((forward, -forward[target], 1., reverse, reverse[target], -1.))
+            else:
+                # d(v, target) >= d(L, target) - d(L, v) and d(v, L) - d(target, L)
+                terms.append((forward, forward[target], -1., reverse, -reverse[target], 1.))
+
+        def estimate(node: int) -> float:
+            best = 0.
+            for forward, forward_constant, forward_sign, reverse, reverse_constant, reverse_sign in terms:
+                # inf - inf gives nan when a landmark says nothing about the pair, nan never compares greater
+                bound = forward_constant + forward_sign * forward[node]
+                if bound > best:
+                    best = bound
+                bound = reverse_constant + reverse_sign * reverse[node]
+                if bound > best:
+                    best = bound
+            return best * multiplier
+
+        return estimate
+
+
+# Pick landmarks far apart: each new one is the node farthest from those chosen so far
+def select_landmarks(csr: CSRGraph, count: int = DEFAULT_LANDMARKS, seed: int = 0) -> 'list[int]':
+    rng = random.Random(seed)
+    num_nodes = csr.num_nodes()
+    closest = [inf] * num_nodes
+    landmarks = []
+    current = rng.randrange(num_nodes)
+    for _ in range(count):
+        dist = search(csr, current).dist
+        for node, distance in dist.items():
+            if distance < closest[node]:
+                closest[node] = distance
+        reached = [(closest[node], node) for node in dist if node not in landmarks]
+        if not reached:
+            break
+        current = max(reached)[1]
+        landmarks.append(current)
+    return landmarks
+
+
+# Precompute landmark tables with one forward and one reverse Dijkstra per landmark
+def build_tables(csr: CSRGraph, count: int = DEFAULT_LANDMARKS, seed: int = 0, progress: bool = True) -> LandmarkTables:
+    start_time = time.time()
+    num_nodes = csr.num_nodes()
+    landmarks = select_landmarks(csr, count, seed)
+    forward = array('d', [inf]) * (num_nodes * len(landmarks))
+    reverse = array('d', [inf]) * (num_nodes * len(landmarks))
+    for k, landmark in enumerate(landmarks):
+        offset = k * num_nodes
+        for node, distance in search(csr, landmark).dist.items():
+            forward[offset + node] = distance
+        for node, distance in reverse_distances(csr, landmark)[0].items():
+            reverse[offset + node] = distance
+        if progress:
+            print(f"Landmark {k + 1}/{len(landmarks)} done, {round(time.time() - start_time, 1)} seconds")
+    return LandmarkTables(csr, landmarks, forward, reverse)
+
+
+# One JSON header line, then the forward and reverse tables
+def save_tables(tables: LandmarkTables, file_name: str = DEFAULT_ALT):
+    header = {
+        "magic": ALT_MAGIC,
+        "version": ALT_VERSION,
+        "graph": graph_fingerprint(tables.csr),
+        "landmarks": tables.landmarks,
+    }
+    tmp_name = f"{file_name}.tmp"
+    with open(tmp_name, 'wb') as file:
+        file.write(json.dumps(header).encode("utf-8") + b"\n")
+        tables.forward.tofile(file)
+        tables.reverse.tofile(file)
+    os.replace(tmp_name, file_name)
+
+
+def load_tables(csr: CSRGraph, file_name: str = DEFAULT_ALT) -> LandmarkTables:
+    with open(file_name, 'rb') as file:
+        header = json.loads(file.readline())
+        if header.get("magic") != ALT_MAGIC or header.get("version") != ALT_VERSION:
+            raise ValueError(f"{file_name} is not a version {ALT_VERSION} landmark table")
+        if header["graph"] != graph_fingerprint(csr):
+            raise ValueError(f"{file_name} was built for a different graph")
+        size = len(header["landmarks"]) * csr.num_nodes()
+        forward = array('d')
+        forward.fromfile(file, size)
+        reverse = array('d')
+        reverse.fromfile(file, size)
+    return LandmarkTables(csr, header["landmarks"], forward, reverse)
+
+
+def main():
+    from graph_lib import Graph
+
+    parser = argparse.ArgumentParser(description="Precompute ALT landmark distance tables for the loaded graph")
+    parser.add_argument("--landmarks", type=int, default=DEFAULT_LANDMARKS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--output", help=f"default: {ALT_NAME} in the data directory")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.data_dir, ALT_NAME)
+    tables = build_tables(Graph(data_dir=args.data_dir).csr, args.landmarks, args.seed)
+    save_tables(tables, output)
+    print(f"Wrote {output}: landmarks {tables.landmarks}")
+
+if __name__ == "__main__":
+    main()
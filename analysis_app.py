@@ -1,11 +1,28 @@
 # Imports
-import time
+import argparse
 import csv
+import os
+import random
+import statistics
+import time
+from concurrent.futures import as_completed
 from queue import PriorityQueue
 
 from graph_lib import Graph
+from pool_lib import default_workers, graph_pool, worker_graph
 from pygame_lib import Window
 
+# Heuristic multiplier sweeps
+# The grid is heuristics x multipliers x (start, end) pairs. Every cell runs A* once
+# untimed, then `repeats` times under time.perf_counter, and records the mean, variance
+# and minimum time together with nodes explored and path distance.
+# Finished cells are appended to a checkpoint CSV as they complete, so an interrupted
+# sweep picks up where it stopped. Cells run on a process pool sharing the graph.
+SWEEP_FILE = "data/sweep.csv"
+SWEEP_HEADER = ["heuristic", "multiplier", "start", "end", "repeats", "mean_time", "variance", "min_time",
+                "nodes_explored", "distance"]
+HEURISTICS = ("euclidean", "manhattan")
+
 
 def backtrace(parent, start, end):
     path = [end]
@@ -22,30 +39,144 @@ def print_path(path: 'list[str]'):
         print(f"{node}->", end="")
     print("T")
 
-def main():
+
+# Multipliers from 0 to max_mult inclusive
+def multiplier_range(max_mult: float = 5, step: float = 0.01) -> 'list[float]':
     multiplier_list = []
-    mult, max_mult, step = 0, 5, 0.01
-    while(mult <= max_mult):
-        multiplier_list.append(round(mult,2))
+    mult = 0
+    while(mult <= max_mult + step / 2):
+        multiplier_list.append(round(mult, 2))
         mult += step
+    return multiplier_list
+
+
+# Identifies a cell in the checkpoint file
+def cell_key(heuristic: str, multiplier: float, start: str, end: str) -> tuple:
+    return (heuristic, f"{multiplier:g}", start, end)
+
+
+# Time one cell, returns a row in SWEEP_HEADER order
+def time_cell(graph: Graph, cell: tuple, repeats: int) -> list:
+    heuristic, multiplier, start, end = cell
+    # Warm up run, also gives nodes explored and distance
+    _, nodes_explored, distance = graph.a_star_search(start, end, multiplier, heuristic, False)
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        graph.a_star_search(start, end, multiplier, heuristic, False)
+        timings.append(time.perf_counter() - start_time)
+    variance = statistics.variance(timings) if repeats > 1 else 0.
+    return [heuristic, f"{multiplier:g}", start, end, repeats, statistics.mean(timings), variance, min(timings),
+            nodes_explored, distance]
+
+
+# time_cell inside a pool worker
+def sweep_task(cell: tuple, repeats: int) -> list:
+    return time_cell(worker_graph(), cell, repeats)
+
+
+# Rows already in the checkpoint file, by cell key
+def read_checkpoint(file_name: str) -> 'dict[tuple, list]':
+    done = {}
+    if not os.path.exists(file_name):
+        return done
+    with open(file_name, 'r', newline='') as file:
+        for row in csv.reader(file):
+            if row and row != SWEEP_HEADER and len(row) == len(SWEEP_HEADER):
+                done[tuple(row[:4])] = row
+    return done
+
+
+# Run every cell not yet in the checkpoint file, appending each result as it finishes
+# Returns all rows for the grid, in grid order
+def run_sweep(graph: Graph, heuristics, multipliers: 'list[float]', pairs: 'list[tuple[str, str]]',
+              repeats: int = 5, workers: int = 1, checkpoint: str = SWEEP_FILE) -> 'list[list]':
+    cells = [(heuristic, multiplier, start, end) for heuristic in heuristics for multiplier in multipliers
+             for start, end in pairs]
+    done = read_checkpoint(checkpoint)
+    todo = [cell for cell in cells if cell_key(*cell) not in done]
+    print(f"{len(cells)} cells, {len(cells) - len(todo)} already in {checkpoint}, running {len(todo)} with {workers} workers")
+
+    new_file = not os.path.exists(checkpoint) or os.path.getsize(checkpoint) == 0
+    with open(checkpoint, 'a', newline='') as file:
+        writer = csv.writer(file)
+        if new_file:
+            writer.writerow(SWEEP_HEADER)
+
+        def record(row: list):
+            writer.writerow(row)
+            file.flush()
+            done[tuple(str(value) for value in row[:4])] = [str(value) for value in row]
+            print(f"{row[0]} multiplier {row[1]} {row[2]}->{row[3]}: {row[5] * 1000:.3f} ms "
+                  f"(sd {row[6] ** 0.5 * 1000:.3f} ms), {row[8]} nodes explored, distance of path {row[9]}")
+
+        if workers <= 1:
+            for cell in todo:
+                record(time_cell(graph, cell, repeats))
+        else:
+            with graph_pool(graph, workers) as pool:
+                futures = [pool.submit(sweep_task, cell, repeats) for cell in todo]
+                for future in as_completed(futures):
+                    record(future.result())
+
+    return [done[cell_key(*cell)] for cell in cells]
+
+
+# Per heuristic summary in the 'Multiplier, Time, Nodes Explored, Distance' format charts.py reads,
+# averaged over the pairs
+def write_summaries(rows: 'list[list]', heuristics):
+    for heuristic in heuristics:
+        by_multiplier: dict[str, list] = {}
+        for row in rows:
+            if row[0] == heuristic:
+                by_multiplier.setdefault(row[1], []).append(row)
+        with open(f"data/{heuristic}.csv", 'w', newline='') as file:
+            writer = csv.writer(file)
+            for multiplier, cell_rows in by_multiplier.items():
+                distances = [float(row[9]) for row in cell_rows if row[9] not in ("", "None")]
+                writer.writerow([multiplier,
+                                 statistics.mean(float(row[5]) for row in cell_rows),
+                                 statistics.mean(int(row[8]) for row in cell_rows),
+                                 statistics.mean(distances) if distances else None])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep A* heuristic multipliers over heuristics and node pairs")
+    parser.add_argument("--heuristics", nargs="+", default=list(HEURISTICS))
+    parser.add_argument("--max-mult", type=float, default=5)
+    parser.add_argument("--step", type=float, default=0.01)
+    parser.add_argument("--pairs", type=int, default=0, help="random start/end pairs added to 1 -> 50")
+    parser.add_argument("--coordinate-pair", type=float, nargs=4, action="append", default=[],
+                        metavar=("START_LON", "START_LAT", "END_LON", "END_LAT"),
+                        help="add a pair given as coordinates, snapped to the nearest nodes (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--checkpoint", default=SWEEP_FILE)
+    parser.add_argument("--fresh", action="store_true", help="discard the checkpoint and start over")
+    args = parser.parse_args()
 
-    with open("data/euclidean.csv", 'w', newline='') as file:
-        writer =csv.writer(file)
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
 
-        graph = Graph()
-        print(multiplier_list)
-        print(f"Testing run_time data from node 1 to 50 with different multipliers")
-        for multiplier in multiplier_list:
-            data = graph.a_star_search('1', '50', multiplier, 'euclidean', False)
-            print(f"Multipler {multiplier} : {data[0]} seconds, {data[1]} nodes explored, distance of path {data[2]}")
-            writer.writerow([multiplier, data[0], data[1], data[2]])
+    graph = Graph()
+    graph.preload()
+    multiplier_list = multiplier_range(args.max_mult, args.step)
+    pairs = [('1', '50')]
+    if args.coordinate_pair:
+        starts = graph.nearest_nodes([(pair[0], pair[1]) for pair in args.coordinate_pair])
+        ends = graph.nearest_nodes([(pair[2], pair[3]) for pair in args.coordinate_pair])
+        pairs += zip(starts, ends)
+    rng = random.Random(args.seed)
+    node_ids = graph.csr.node_ids
+    for _ in range(args.pairs):
+        pairs.append((rng.choice(node_ids), rng.choice(node_ids)))
 
-    with open("data/manhattan.csv", 'w', newline='') as file:
-        writer =csv.writer(file)
-        for multiplier in multiplier_list:
-            data = graph.a_star_search('1', '50', multiplier, 'manhattan', False)
-            print(f"Multipler {multiplier} : {data[0]} seconds, {data[1]} nodes explored, distance of path {data[2]}")
-            writer.writerow([multiplier, data[0], data[1], data[2]])
+    print(f"Testing run_time data for {len(pairs)} node pairs with {len(multiplier_list)} multipliers")
+    start_time = time.perf_counter()
+    rows = run_sweep(graph, args.heuristics, multiplier_list, pairs, args.repeats, args.workers, args.checkpoint)
+    write_summaries(rows, args.heuristics)
+    print(f"Sweep finished in {round(time.perf_counter() - start_time, 2)} seconds")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
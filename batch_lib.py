@@ -0,0 +1,151 @@
+# Imports
+import argparse
+import contextlib
+import sys
+import time
+
+from pool_lib import default_workers, graph_pool, worker_graph
+
+# Batch routing
+# Queries are (start, end, budget) lines, one per query, or (start longitude, start latitude,
+# end longitude, end latitude, budget) lines whose points are snapped to the nearest nodes
+# in one batch before routing (see spatial_lib.KDTree). The graph is loaded once
+# (ideally memory-mapped from a snapshot, see snapshot_lib.py) and shared by a process
+# pool (see pool_lib.py). Results stream back in input order as they complete.
+#   exact: label-setting energy constrained shortest path (rcsp_lib.py)
+#   larac: Lagrangian relaxation, near-optimal with a gap (larac_lib.py)
+#   ucs:   unconstrained shortest distance, the budget is ignored
+# A query that cannot be routed at all (an unknown node id) reports why in the error
+# column, while a query with no path within budget leaves every result column empty.
+METHODS = ("exact", "larac", "ucs")
+RESULT_HEADER = "start,end,budget,distance,cost,path,error"
+
+
+# Read (start, end, budget) queries, blank lines, '#' comments and a header line are skipped
+# start and end are (longitude, latitude) pairs on lines with five fields
+def read_queries(file_name: str) -> 'list[tuple]':
+    queries = []
+    with open(file_name, 'r') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = [field.strip() for field in line.split(",")]
+            if line_number == 1 and fields[0] == "start":
+                continue
+            if len(fields) == 3:
+                queries.append((fields[0], fields[1], float(fields[2])))
+            elif len(fields) == 5:
+                values = [float(field) for field in fields]
+                queries.append(((values[0], values[1]), (values[2], values[3]), values[4]))
+            else:
+                raise ValueError(f"{file_name}:{line_number}: expected start,end,budget or "
+                                 f"start_lon,start_lat,end_lon,end_lat,budget")
+    return queries
+
+
+# Queries with coordinate endpoints replaced by their nearest nodes, snapped in one batch
+def snap_queries(graph, queries: 'list[tuple]') -> 'list[tuple[str, str, float]]':
+    points = [node for start_node, end_node, _ in queries for node in (start_node, end_node)]
+    nodes = graph.resolve_nodes(*points)
+    return [(nodes[2 * i], nodes[2 * i + 1], query[2]) for i, query in enumerate(queries)]
+
+
+# Run one query on graph, returns (path, distance, cost) or None if there is no path within budget
+# Raises KeyError for a node id that is not in the graph
+def route_query(graph, query: 'tuple[str, str, float]', method: str = "exact"):
+    start_node, end_node, budget = query
+    for node in (start_node, end_node):
+        if node not in graph.csr.index:
+            raise KeyError(f"unknown node {node}")
+    if method == "exact":
+        return graph.constrained_search(start_node, end_node, budget)
+    if method == "larac":
+        result = graph.larac_search(start_node, end_node, budget)
+        return (result.path, result.distance, result.cost) if result else None
+    if method == "ucs":
+        return graph.ucs_search(start_node, end_node)
+    raise ValueError(f"Unknown method {method}, expected one of {', '.join(METHODS)}")
+
+
+# (route_query result, None) or (None, error message) for a query that cannot be routed
+def checked_route(graph, query: 'tuple[str, str, float]', method: str = "exact"):
+    try:
+        return route_query(graph, query, method), None
+    except KeyError as error:
+        return None, error.args[0]
+
+
+# checked_route inside a pool worker
+def batch_task(method: str, query: 'tuple[str, str, float]'):
+    return checked_route(worker_graph(), query, method)
+
+
+# Yield (query, result, error) in input order, with coordinates snapped to node ids in query
+# error is None unless the query could not be routed (see checked_route)
+# workers > 1 runs the queries on a process pool sharing graph
+def run_batch(graph, queries: 'list[tuple[str, str, float]]', method: str = "exact", workers: int = 1):
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, expected one of {', '.join(METHODS)}")
+    queries = snap_queries(graph, queries)
+    if workers <= 1:
+        for query in queries:
+            yield (query, *checked_route(graph, query, method))
+        return
+
+    # Chunks keep the pickling overhead small without holding results back for long
+    chunk_size = max(1, min(64, len(queries) // (8 * workers)))
+    with graph_pool(graph, workers) as pool:
+        results = pool.map(batch_task, [method] * len(queries), queries, chunksize=chunk_size)
+        for query, (result, error) in zip(queries, results):
+            yield query, result, error
+
+
+# One CSV line per query, distance/cost/path are left empty when there is no path
+# The budget is written with repr, which reads back as exactly the same float
+def format_result(query: 'tuple[str, str, float]', result, error: str = None) -> str:
+    start_node, end_node, budget = query
+    if result is None:
+        return f"{start_node},{end_node},{budget!r},,,,{error or ''}"
+    path, distance, cost = result
+    return f"{start_node},{end_node},{budget!r},{round(distance, 3)},{round(cost, 3)},{'->'.join(path)},"
+
+
+def main():
+    from graph_lib import Graph
+    from snapshot_lib import DEFAULT_SNAPSHOT, compile_snapshot, snapshot_is_fresh
+
+    parser = argparse.ArgumentParser(description="Route a file of start,end,budget queries on a process pool")
+    parser.add_argument("queries", help="text file with one start,end,budget query per line")
+    parser.add_argument("--output", default="-", help="results CSV, '-' for stdout")
+    parser.add_argument("--method", choices=METHODS, default="exact")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    args = parser.parse_args()
+
+    queries = read_queries(args.queries)
+    output = sys.stdout if args.output == "-" else open(args.output, 'w')
+
+    # Loading messages go to stderr when the results go to stdout
+    with contextlib.redirect_stdout(sys.stderr if output is sys.stdout else sys.stdout):
+        #* Workers share the memory-mapped snapshot, compile it once if it is missing or stale
+        if not snapshot_is_fresh(DEFAULT_SNAPSHOT):
+            compile_snapshot("data", DEFAULT_SNAPSHOT)
+        graph = Graph()
+        graph.preload()
+
+    start_time = time.perf_counter()
+    found = failed = 0
+    print(RESULT_HEADER, file=output)
+    for query, result, error in run_batch(graph, queries, args.method, args.workers):
+        found += result is not None
+        failed += error is not None
+        print(format_result(query, result, error), file=output, flush=output is sys.stdout)
+    elapsed = time.perf_counter() - start_time
+    if output is not sys.stdout:
+        output.close()
+
+    print(f"{len(queries)} queries ({found} routed, {failed} failed) in {round(elapsed, 2)} seconds with {args.workers} workers, "
+          f"{round(len(queries) / elapsed, 1) if elapsed else 0} queries/second", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
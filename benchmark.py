@@ -0,0 +1,304 @@
+# Imports
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+from itertools import islice
+from math import ceil
+
+from alt_lib import ALT_NAME
+from ch_lib import CH_NAME, graph_fingerprint
+from graph_lib import Graph
+from ksp_lib import k_shortest_paths
+from main import astar_start, ucs_dist_start, yen_algo_mod
+from memory_lib import PeakMemory, format_memory_report
+
+# Routing benchmark suite
+# Query sets are drawn with a fixed seed and split by straight-line distance relative
+# to the map diagonal into local, mid and cross-city buckets. Every engine runs every
+# query of a bucket; latency uses time.perf_counter, peak memory a separate
+# tracemalloc pass (tracing slows Python down, so it is kept out of the timings)
+# that records the largest single query peak. The graph's memory report by component
+# is stored alongside the results.
+# Results go to JSON (full detail) and CSV (one row per engine and bucket, for charts.py).
+# A stored baseline turns the run into a regression check.
+BUCKETS = {
+    "local": (0., 0.1),
+    "mid": (0.1, 0.35),
+    "cross": (0.35, float("inf")),
+}
+DEFAULT_QUERIES = 30
+# Budget given to budgeted engines, as a fraction of the unconstrained path's energy
+BUDGET_FACTOR = 0.999
+# k-shortest path engines only run the first few queries of each bucket, with a budget
+# some path among the first YEN_PATHS fits, tighter budgets can take thousands of paths
+YEN_QUERIES = 5
+YEN_PATHS = 10
+# Latency changes smaller than this are timer noise, whatever the tolerance
+LATENCY_FLOOR_MS = 1.
+# Likewise for peak query memory, allocator rounding moves it by a few KB
+MEMORY_FLOOR_KB = 64
+DEFAULT_OUTPUT = "data/benchmark"
+CSV_HEADER = ["engine", "bucket", "queries", "p50_ms", "p90_ms", "p99_ms", "max_ms", "mean_nodes", "peak_kb", "qps"]
+
+
+# Engines take (graph, start, end, budget) and return (distance, nodes settled) where nodes
+# is None when the entry point does not report it. Graph searches leave their SearchResult
+# in graph.result (the benchmark graph has no cache, so it is always fresh)
+def run_ucs_search(graph, start, end, budget):
+    result = graph.ucs_search(start, end)
+    return (result and result[1], graph.result.nodes_settled)
+
+
+def run_bidirectional_ucs(graph, start, end, budget):
+    result = graph.ucs_search(start, end, bidirectional=True)
+    return (result and result[1], graph.result.nodes_settled)
+
+
+def run_a_star_euclidean(graph, start, end, budget):
+    _, _, distance = graph.a_star_search(start, end, 1., "euclidean", False)
+    return (distance, graph.result.nodes_settled)
+
+
+def run_a_star_landmarks(graph, start, end, budget):
+    _, _, distance = graph.a_star_search(start, end, 1., "landmarks", False)
+    return (distance, graph.result.nodes_settled)
+
+
+def run_astar_start(graph, start, end, budget):
+    result = astar_start(graph, start, end, 0.86)
+    return (result and result[1], None)
+
+
+def run_ucs_dist_start(graph, start, end, budget):
+    result = ucs_dist_start(graph, start, end)
+    return (result and result[1], None)
+
+
+def run_ch_search(graph, start, end, budget):
+    result = graph.ch_search(start, end)
+    return (result and result[1], None)
+
+
+def run_constrained_search(graph, start, end, budget):
+    result = graph.constrained_search(start, end, budget)
+    return (result and result[1], None)
+
+
+def run_larac_search(graph, start, end, budget):
+    result = graph.larac_search(start, end, budget)
+    return (result and result.distance, None)
+
+
+def run_yen_ucs(graph, start, end, budget):
+    result = yen_algo_mod(graph, start, end, budget, astar=False)
+    return (result and result[1], None)
+
+
+def run_yen_astar(graph, start, end, budget):
+    result = yen_algo_mod(graph, start, end, budget, astar=True)
+    return (result and result[1], None)
+
+
+# name -> (engine, True for k-shortest path engines, preprocessing file it needs in the data directory or None)
+ENGINES = {
+    "ucs_search": (run_ucs_search, False, None),
+    "ucs_bidirectional": (run_bidirectional_ucs, False, None),
+    "a_star_euclidean": (run_a_star_euclidean, False, None),
+    "a_star_landmarks": (run_a_star_landmarks, False, ALT_NAME),
+    "astar_start": (run_astar_start, False, None),
+    "ucs_dist_start": (run_ucs_dist_start, False, None),
+    "ch_search": (run_ch_search, False, CH_NAME),
+    "constrained_search": (run_constrained_search, False, None),
+    "larac_search": (run_larac_search, False, None),
+    "yen_ucs": (run_yen_ucs, True, None),
+    "yen_astar": (run_yen_astar, True, None),
+}
+
+
+# Fixed query sets: {bucket: [(start, end, budget, yen budget)]}
+# Pairs are sampled until every bucket is full (or attempts run out). Each gets a budget
+# just under the energy of its shortest path, so budgeted engines have work to do, and
+# the first YEN_QUERIES also get the least energy among their first YEN_PATHS paths
+def make_queries(graph: Graph, per_bucket: int = DEFAULT_QUERIES, seed: int = 0) -> 'dict[str, list]':
+    csr = graph.csr
+    rng = random.Random(seed)
+    xs, ys = csr.xs, csr.ys
+    num_nodes = csr.num_nodes()
+    diagonal = ((max(xs) - min(xs)) ** 2 + (max(ys) - min(ys)) ** 2) ** 0.5 or 1.
+
+    queries: dict[str, list] = {bucket: [] for bucket in BUCKETS}
+    attempts = 0
+    while any(len(pairs) < per_bucket for pairs in queries.values()) and attempts < 10000 * per_bucket:
+        attempts += 1
+        start, end = rng.randrange(num_nodes), rng.randrange(num_nodes)
+        ratio = ((xs[start] - xs[end]) ** 2 + (ys[start] - ys[end]) ** 2) ** 0.5 / diagonal
+        for bucket, (low, high) in BUCKETS.items():
+            if low <= ratio < high and len(queries[bucket]) < per_bucket:
+                shortest = graph.ucs_search(csr.node_ids[start], csr.node_ids[end])
+                #! Only connected pairs make useful queries
+                if shortest is not None:
+                    start_node, end_node = csr.node_ids[start], csr.node_ids[end]
+                    yen_budget = None
+                    if len(queries[bucket]) < YEN_QUERIES:
+                        paths = islice(k_shortest_paths(graph, start_node, end_node, astar=False), YEN_PATHS)
+                        yen_budget = min(cost for _, _, cost in paths)
+                    queries[bucket].append((start_node, end_node, shortest[2] * BUDGET_FACTOR, yen_budget))
+    return queries
+
+
+# Nearest-rank percentile of a non-empty list
+def percentile(values: 'list[float]', p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, ceil(p / 100 * len(ordered)) - 1)]
+
+
+# Run one engine over one bucket, returns a result dict
+def bench_engine(graph: Graph, name: str, bucket: str, queries: list, memory: bool = True) -> dict:
+    engine, k_paths, _ = ENGINES[name]
+    if k_paths:
+        queries = [(start, end, yen_budget) for start, end, _, yen_budget in queries if yen_budget is not None]
+    else:
+        queries = [(start, end, budget) for start, end, budget, _ in queries]
+    latencies = []
+    nodes = []
+    distances = []
+    # Engines print paths and progress, keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        # One untimed warm up query loads tables and components on first use
+        if queries:
+            engine(graph, *queries[0])
+        for start, end, budget in queries:
+            start_time = time.perf_counter()
+            distance, settled = engine(graph, start, end, budget)
+            latencies.append(time.perf_counter() - start_time)
+            distances.append(distance)
+            if settled is not None:
+                nodes.append(settled)
+
+        peak = None
+        if memory and queries:
+            peak = 0
+            for start, end, budget in queries:
+                with PeakMemory() as query_peak:
+                    engine(graph, start, end, budget)
+                peak = max(peak, query_peak.peak)
+
+    total = sum(latencies)
+    return {
+        "engine": name,
+        "bucket": bucket,
+        "queries": len(queries),
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p90_ms": percentile(latencies, 90) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "max_ms": max(latencies) * 1000 if latencies else None,
+        "mean_nodes": sum(nodes) / len(nodes) if nodes else None,
+        "peak_kb": peak / 1024 if peak is not None else None,
+        "qps": len(queries) / total if total else None,
+        "distances": distances,
+    }
+
+
+# Regressions against a baseline report, as readable messages
+# A distance that changed is always a regression, median latency and peak query memory only beyond the tolerance
+def compare(report: dict, baseline: dict, tolerance: float = 0.25) -> 'list[str]':
+    problems = []
+    if baseline.get("graph") != report["graph"] or baseline.get("seed") != report["seed"]:
+        return [f"Baseline was recorded on another graph or query set, re-record it with --save-baseline"]
+    previous = {(row["engine"], row["bucket"]): row for row in baseline["results"]}
+    for row in report["results"]:
+        old = previous.get((row["engine"], row["bucket"]))
+        if old is None:
+            continue
+        label = f"{row['engine']} / {row['bucket']}"
+        for new_distance, old_distance in zip(row["distances"], old["distances"]):
+            if (new_distance is None) != (old_distance is None) or \
+                    (new_distance is not None and abs(new_distance - old_distance) > 1e-6 * max(1., abs(old_distance))):
+                problems.append(f"{label}: distance changed from {old_distance} to {new_distance}")
+                break
+        if old["p50_ms"] and row["p50_ms"] and row["p50_ms"] > old["p50_ms"] * (1 + tolerance) \
+                and row["p50_ms"] - old["p50_ms"] > LATENCY_FLOOR_MS:
+            problems.append(f"{label}: p50 latency {row['p50_ms']:.3f} ms, baseline {old['p50_ms']:.3f} ms")
+        if old["peak_kb"] and row["peak_kb"] and row["peak_kb"] > old["peak_kb"] * (1 + tolerance) \
+                and row["peak_kb"] - old["peak_kb"] > MEMORY_FLOOR_KB:
+            problems.append(f"{label}: peak query memory {row['peak_kb']:.0f} KB, baseline {old['peak_kb']:.0f} KB")
+    return problems
+
+
+# JSON with every detail, CSV with one row per engine and bucket
+def write_report(report: dict, output: str):
+    with open(f"{output}.json", 'w') as file:
+        json.dump(report, file, indent=1)
+    with open(f"{output}.csv", 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for row in report["results"]:
+            writer.writerow([row[column] for column in CSV_HEADER])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every routing entry point on fixed query sets")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), help="default: every engine whose preprocessing file exists")
+    parser.add_argument("--buckets", nargs="+", choices=list(BUCKETS), default=list(BUCKETS))
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="queries per bucket")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="writes <output>.json and <output>.csv")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 latency increase over the baseline")
+    parser.add_argument("--save-baseline", help="also store this run as a baseline JSON report")
+    args = parser.parse_args()
+
+    graph = Graph()
+    graph.preload()
+    engines = args.engines or [name for name, (_, _, needs) in ENGINES.items() if needs is None or os.path.exists(graph.data_file(needs) or "")]
+    skipped = [name for name in ENGINES if name not in engines]
+    if skipped and not args.engines:
+        print(f"Skipping {', '.join(skipped)} (no preprocessing file, build it with ch_lib.py / alt_lib.py)")
+
+    queries = make_queries(graph, args.queries, args.seed)
+    report = {
+        "graph": graph_fingerprint(graph.csr),
+        "seed": args.seed,
+        "queries_per_bucket": args.queries,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": [],
+    }
+    for name in engines:
+        for bucket in args.buckets:
+            row = bench_engine(graph, name, bucket, queries[bucket], not args.no_memory)
+            report["results"].append(row)
+            p50 = f"{row['p50_ms']:.3f}" if row["p50_ms"] is not None else "-"
+            p99 = f"{row['p99_ms']:.3f}" if row["p99_ms"] is not None else "-"
+            qps = f"{row['qps']:.1f}" if row["qps"] else "-"
+            print(f"{name:20} {bucket:6} {row['queries']:4} queries  p50 {p50} ms  p99 {p99} ms  {qps} queries/second")
+
+    # After every engine ran, so tables and caches they loaded are included
+    report["memory"] = graph.memory_report()
+    print(format_memory_report(report["memory"]))
+
+    write_report(report, args.output)
+    print(f"Wrote {args.output}.json and {args.output}.csv")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(report, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            problems = compare(report, json.load(file), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
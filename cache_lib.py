@@ -0,0 +1,153 @@
+# Imports
+import pickle
+import shelve
+from collections import OrderedDict
+
+# Query result cache
+# Results are kept in an LRU ordered dict bounded by entry count and by total pickled
+# size, so a few very long paths cannot crowd out memory. An optional shelve file
+# keeps every result across runs, it is cleared when opened for a different graph.
+#
+# Budgeted queries (energy constrained search, k-shortest path within budget) are
+# stored per (query without budget) with what is known about each budget:
+#   answer with cost c found for budget b: also the answer for every budget in [c, b],
+#     a smaller budget only removes paths the search did not pick
+#   no path for budget b: no path for any budget <= b either
+# The unconstrained optimum is the answer for every budget >= its cost; pass its key
+# as unconstrained_key to reuse a cached unconstrained search.
+MISSING = object()
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 disk_file: str = None, fingerprint = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (value, size in bytes), least recently used first
+        self.entries: OrderedDict = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.budget_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self.disk = None
+        if disk_file:
+            self.disk = shelve.open(disk_file)
+            #! Results from another graph are meaningless here
+            if self.disk.get("__graph__") != fingerprint:
+                self.disk.clear()
+                self.disk["__graph__"] = fingerprint
+
+    # Cached value for key, or MISSING
+    def get(self, key: tuple):
+        value = self._lookup(key)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: tuple, value):
+        self._store(key, value)
+        if self.disk is not None:
+            self.disk[repr(key)] = value
+
+    # Cached answer for key at budget, or MISSING
+    def get_budgeted(self, key: tuple, budget: float, unconstrained_key: tuple = None):
+        known = self._lookup(("budgeted",) + key)
+        if known is not MISSING:
+            if budget <= known["infeasible"]:
+                self.hits += 1
+                self.budget_hits += 1
+                return None
+            for cost, answered_budget, value in known["answers"]:
+                if cost <= budget <= answered_budget:
+                    self.hits += 1
+                    self.budget_hits += budget != answered_budget
+                    return value
+
+        if unconstrained_key is not None:
+            value = self._lookup(unconstrained_key)
+            # No path at all means no path within any budget
+            if value is None or (value is not MISSING and value[2] <= budget):
+                self.hits += 1
+                self.budget_hits += 1
+                return value
+
+        self.misses += 1
+        return MISSING
+
+    # value: (path, distance, cost) or None when nothing fits the budget
+    def put_budgeted(self, key: tuple, budget: float, value):
+        key = ("budgeted",) + key
+        known = self._lookup(key)
+        if known is MISSING:
+            known = {"infeasible": float("-inf"), "answers": []}
+        else:
+            # Copy so the entry's recorded size is recomputed on store
+            known = {"infeasible": known["infeasible"], "answers": list(known["answers"])}
+        if value is None:
+            known["infeasible"] = max(known["infeasible"], budget)
+        else:
+            known["answers"].append((value[2], budget, value))
+        self.put(key, known)
+
+    # Counters and current usage, hit_rate is None before the first lookup
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "budget_hits": self.budget_hits,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+        if self.disk is not None:
+            fingerprint = self.disk.get("__graph__")
+            self.disk.clear()
+            self.disk["__graph__"] = fingerprint
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    # Memory first, then disk (promoted back into memory), without counting
+    def _lookup(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry[0]
+        if self.disk is not None:
+            value = self.disk.get(repr(key), MISSING)
+            if value is not MISSING:
+                self.disk_hits += 1
+                self._store(key, value)
+                return value
+        return MISSING
+
+    def _store(self, key: tuple, value):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        #! Too big to cache in memory at all
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.total_bytes += size
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
@@ -0,0 +1,358 @@
+# Imports
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left
+from math import inf
+
+from csr_lib import CSRGraph
+from search_lib import SearchResult
+
+# Contraction Hierarchies on the distance metric
+# Preprocessing contracts nodes one at a time, cheapest first by a priority of edge
+# difference (shortcuts added minus edges removed), contracted neighbours and level
+# (one above the highest contracted neighbour), which spreads contraction evenly over
+# the graph. A shortcut u -> w through v is added whenever no witness path avoiding v
+# is as short. Priorities use short witness searches, the contraction itself a longer one.
+# A query then only relaxes edges going up the order: forward from the source over
+# up_* edges, backward from the target over down_* edges (incoming edges from higher
+# nodes). Shortcuts remember their middle node so the original path can be unpacked.
+CH_MAGIC = "CZCH"
+CH_VERSION = 1
+CH_NAME = "graph.ch"
+DEFAULT_CH = os.path.join("data", CH_NAME)
+WITNESS_SETTLE_LIMIT = 1000
+PRIORITY_SETTLE_LIMIT = 50
+EDGE_DIFFERENCE_WEIGHT = 4
+LEVEL_WEIGHT = 2
+
+# name -> typecode, in file order
+CH_SECTIONS = (
+    ("rank", 'i'),
+    ("up_offsets", 'i'),
+    ("up_targets", 'i'),
+    ("up_weights", 'd'),
+    ("down_offsets", 'i'),
+    ("down_sources", 'i'),
+    ("down_weights", 'd'),
+    ("shortcut_keys", 'q'),
+    ("shortcut_middles", 'i'),
+)
+
+
+# Identify the graph a hierarchy was built for by its contents, so the same graph gets
+# the same fingerprint whether it was read from JSON, a snapshot or dictionaries
+# Computed once per graph and kept on the CSR object
+def graph_fingerprint(csr: CSRGraph) -> dict:
+    fingerprint = csr.__dict__.get("_fingerprint")
+    if fingerprint is None:
+        sha = hashlib.sha256()
+        sha.update("\n".join(csr.node_ids).encode("utf-8"))
+        for name in ("offsets", "targets", "dists", "costs", "xs", "ys"):
+            sha.update(memoryview(getattr(csr, name)).cast('B'))
+        fingerprint = {
+            "num_nodes": csr.num_nodes(),
+            "num_edges": csr.num_edges(),
+            "checksum": sha.hexdigest(),
+        }
+        csr.__dict__["_fingerprint"] = fingerprint
+    return fingerprint
+
+
+# Shortest distances from source avoiding one node, bounded by weight and settled count
+# Stops early once every node in targets is settled
+def witness_search(out_edges: 'list[dict]', source: int, avoid: int, max_weight: float, targets,
+                   settle_limit: int) -> 'dict[int, float]':
+    dist = {source: 0.}
+    heap = [(0., source)]
+    settled = 0
+    remaining = len(targets)
+    while heap:
+        current_distance, current_node = heapq.heappop(heap)
+        if current_distance > dist[current_node]:
+            continue
+        if current_distance > max_weight:
+            break
+        if current_node in targets:
+            remaining -= 1
+            if not remaining:
+                break
+        settled += 1
+        if settled > settle_limit:
+            break
+        for adj_node, weight in out_edges[current_node].items():
+            if adj_node == avoid:
+                continue
+            new_distance = current_distance + weight
+            if new_distance <= max_weight and (adj_node not in dist or new_distance < dist[adj_node]):
+                dist[adj_node] = new_distance
+                heapq.heappush(heap, (new_distance, adj_node))
+    return dist
+
+
+# Shortcuts needed to contract node, as (u, w, weight)
+def contraction_shortcuts(out_edges: 'list[dict]', in_edges: 'list[dict]', node: int,
+                          settle_limit: int = WITNESS_SETTLE_LIMIT) -> 'list[tuple[int, int, float]]':
+    shortcuts = []
+    outgoing = out_edges[node]
+    if not outgoing:
+        return shortcuts
+    for u, weight_in in in_edges[node].items():
+        max_out = max((weight for w, weight in outgoing.items() if w != u), default=None)
+        if max_out is None:
+            continue
+        witness = witness_search(out_edges, u, node, weight_in + max_out, outgoing, settle_limit)
+        for w, weight_out in outgoing.items():
+            if w == u:
+                continue
+            shortcut_weight = weight_in + weight_out
+            if witness.get(w, inf) > shortcut_weight:
+                shortcuts.append((u, w, shortcut_weight))
+    return shortcuts
+
+
+# Build the hierarchy for a CSR graph, returns the section arrays by name
+def build_hierarchy(csr: CSRGraph, progress: bool = True) -> 'dict[str, array]':
+    num_nodes = csr.num_nodes()
+    offsets, targets, dists = csr.offsets, csr.targets, csr.dists
+
+    # Mutable remaining graph, parallel edges keep the shortest
+    out_edges: list[dict] = [{} for _ in range(num_nodes)]
+    in_edges: list[dict] = [{} for _ in range(num_nodes)]
+    for u in range(num_nodes):
+        for e in range(offsets[u], offsets[u + 1]):
+            w = targets[e]
+            if w != u and dists[e] < out_edges[u].get(w, inf):
+                out_edges[u][w] = dists[e]
+                in_edges[w][u] = dists[e]
+
+    middles: dict[int, int] = {}
+    deleted_neighbours = [0] * num_nodes
+    level = [0] * num_nodes
+    up_edges: list = [None] * num_nodes
+    down_edges: list = [None] * num_nodes
+    rank = array('i', bytes(4 * num_nodes))
+
+    def priority(node: int) -> int:
+        shortcuts = contraction_shortcuts(out_edges, in_edges, node, PRIORITY_SETTLE_LIMIT)
+        edge_difference = len(shortcuts) - len(in_edges[node]) - len(out_edges[node])
+        return EDGE_DIFFERENCE_WEIGHT * edge_difference + deleted_neighbours[node] + LEVEL_WEIGHT * level[node]
+
+    heap = [(priority(node), node) for node in range(num_nodes)]
+    heapq.heapify(heap)
+
+    start_time = time.time()
+    order = 0
+    while heap:
+        _, node = heapq.heappop(heap)
+        # Lazy update: re-evaluate and requeue if it is no longer the cheapest
+        node_priority = priority(node)
+        if heap and node_priority > heap[0][0]:
+            heapq.heappush(heap, (node_priority, node))
+            continue
+        shortcuts = contraction_shortcuts(out_edges, in_edges, node)
+
+        for u, w, weight in shortcuts:
+            if weight < out_edges[u].get(w, inf):
+                out_edges[u][w] = weight
+                in_edges[w][u] = weight
+                middles[u * num_nodes + w] = node
+
+        # Every remaining neighbour ranks higher than node
+        up_edges[node] = out_edges[node]
+        down_edges[node] = in_edges[node]
+        for u in in_edges[node]:
+            del out_edges[u][node]
+            deleted_neighbours[u] += 1
+            level[u] = max(level[u], level[node] + 1)
+        for w in out_edges[node]:
+            del in_edges[w][node]
+            deleted_neighbours[w] += 1
+            level[w] = max(level[w], level[node] + 1)
+        out_edges[node] = {}
+        in_edges[node] = {}
+
+        rank[node] = order
+        order += 1
+        if progress and order % 10000 == 0:
+            print(f"Contracted {order}/{num_nodes} nodes, {len(middles)} shortcuts, {round(time.time() - start_time, 1)} seconds")
+
+    sections = {"rank": rank}
+    for prefix, other, edges in (("up", "targets", up_edges), ("down", "sources", down_edges)):
+        edge_offsets = array('i', [0])
+        edge_nodes = array('i')
+        edge_weights = array('d')
+        for node in range(num_nodes):
+            for adj_node, weight in edges[node].items():
+                edge_nodes.append(adj_node)
+                edge_weights.append(weight)
+            edge_offsets.append(len(edge_nodes))
+        sections[f"{prefix}_offsets"] = edge_offsets
+        sections[f"{prefix}_{other}"] = edge_nodes
+        sections[f"{prefix}_weights"] = edge_weights
+
+    # Only shortcuts that survived in the hierarchy are needed for unpacking
+    keys = sorted(middles)
+    sections["shortcut_keys"] = array('q', keys)
+    sections["shortcut_middles"] = array('i', (middles[key] for key in keys))
+    return sections
+
+
+# Write the hierarchy: one JSON header line, then the raw arrays in CH_SECTIONS order
+def save_hierarchy(sections: 'dict[str, array]', fingerprint: dict, file_name: str = DEFAULT_CH):
+    header = {
+        "magic": CH_MAGIC,
+        "version": CH_VERSION,
+        "graph": fingerprint,
+        "sections": {name: len(sections[name]) for name, _ in CH_SECTIONS},
+    }
+    tmp_name = f"{file_name}.tmp"
+    with open(tmp_name, 'wb') as file:
+        file.write(json.dumps(header).encode("utf-8") + b"\n")
+        for name, _ in CH_SECTIONS:
+            sections[name].tofile(file)
+    os.replace(tmp_name, file_name)
+
+
+# Contracted graph ready for queries
+class ContractionHierarchy:
+    def __init__(self, csr: CSRGraph, sections: 'dict[str, array]'):
+        self.csr = csr
+        self.num_nodes = csr.num_nodes()
+        for name, _ in CH_SECTIONS:
+            setattr(self, name, sections[name])
+
+    # Load a saved hierarchy, checking it was built for this graph
+    @classmethod
+    def load(cls, csr: CSRGraph, file_name: str = DEFAULT_CH) -> 'ContractionHierarchy':
+        with open(file_name, 'rb') as file:
+            header = json.loads(file.readline())
+            if header.get("magic") != CH_MAGIC or header.get("version") != CH_VERSION:
+                raise ValueError(f"{file_name} is not a version {CH_VERSION} contraction hierarchy")
+            if header["graph"] != graph_fingerprint(csr):
+                raise ValueError(f"{file_name} was built for a different graph")
+            sections = {}
+            for name, typecode in CH_SECTIONS:
+                values = array(typecode)
+                values.fromfile(file, header["sections"][name])
+                sections[name] = values
+        return cls(csr, sections)
+
+    # Middle node of shortcut u -> w, or -1 for an original edge
+    def middle(self, u: int, w: int) -> int:
+        key = u * self.num_nodes + w
+        i = bisect_left(self.shortcut_keys, key)
+        if i < len(self.shortcut_keys) and self.shortcut_keys[i] == key:
+            return self.shortcut_middles[i]
+        return -1
+
+    # Replace shortcuts along a path by the original edges they stand for
+    def unpack(self, path: 'list[int]') -> 'list[int]':
+        unpacked = [path[0]]
+        stack = [(u, w) for u, w in zip(path, path[1:])]
+        stack.reverse()
+        while stack:
+            u, w = stack.pop()
+            middle = self.middle(u, w)
+            if middle < 0:
+                unpacked.append(w)
+            else:
+                stack.append((middle, w))
+                stack.append((u, middle))
+        return unpacked
+
+    # Bidirectional upward Dijkstra, each side stops once its queue top reaches the best meeting distance
+    # Stall-on-demand: a node reached more cheaply through a higher node (an edge of the
+    # other direction's arrays) cannot be on a shortest up-down path, so its edges are not relaxed
+    def query(self, source: int, target: int) -> SearchResult:
+        sides = (
+            (self.up_offsets, self.up_targets, self.up_weights),
+            (self.down_offsets, self.down_sources, self.down_weights),
+        )
+        dist = ({source: 0.}, {target: 0.})
+        parent = ({}, {})
+        heaps = ([(0., source)], [(0., target)])
+        best_distance, meeting_node = (0., source) if source == target else (inf, None)
+        nodes_settled = 0
+
+        while True:
+            for side in (0, 1):
+                heap = heaps[side]
+                while heap and heap[0][0] > dist[side][heap[0][1]]:
+                    heapq.heappop(heap)
+                if heap and heap[0][0] >= best_distance:
+                    heap.clear()
+            if not heaps[0] and not heaps[1]:
+                break
+
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            offsets, adjacent, weights = sides[side]
+            side_dist, side_parent, heap = dist[side], parent[side], heaps[side]
+            current_distance, current_node = heapq.heappop(heap)
+            nodes_settled += 1
+
+            other_distance = dist[1 - side].get(current_node)
+            if other_distance is not None and current_distance + other_distance < best_distance:
+                best_distance, meeting_node = current_distance + other_distance, current_node
+
+            stall_offsets, stall_adjacent, stall_weights = sides[1 - side]
+            stalled = False
+            for e in range(stall_offsets[current_node], stall_offsets[current_node + 1]):
+                higher_distance = side_dist.get(stall_adjacent[e])
+                if higher_distance is not None and higher_distance + stall_weights[e] < current_distance:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+
+            for e in range(offsets[current_node], offsets[current_node + 1]):
+                adj_node = adjacent[e]
+                new_distance = current_distance + weights[e]
+                if adj_node not in side_dist or new_distance < side_dist[adj_node]:
+                    side_dist[adj_node] = new_distance
+                    side_parent[adj_node] = current_node
+                    heapq.heappush(heap, (new_distance, adj_node))
+
+        index_path = None
+        if meeting_node is not None:
+            path = [meeting_node]
+            while path[-1] != source:
+                path.append(parent[0][path[-1]])
+            path.reverse()
+            while path[-1] != target:
+                path.append(parent[1][path[-1]])
+            index_path = self.unpack(path)
+
+        merged = dict(dist[1])
+        merged.update(dist[0])
+        return SearchResult(self.csr, source, target, merged, {}, nodes_settled, index_path)
+
+
+# Preprocess a graph and save its hierarchy, file_name None only builds it
+def build_and_save(csr: CSRGraph, file_name: str = DEFAULT_CH) -> ContractionHierarchy:
+    start_time = time.time()
+    sections = build_hierarchy(csr)
+    if file_name:
+        save_hierarchy(sections, graph_fingerprint(csr), file_name)
+        print(f"Wrote {file_name}: {len(sections['shortcut_keys'])} shortcuts")
+    else:
+        print(f"Built {len(sections['shortcut_keys'])} shortcuts")
+    print(f"Time elapsed: {round(time.time() - start_time, 2)} seconds.")
+    return ContractionHierarchy(csr, sections)
+
+
+def main():
+    from graph_lib import Graph
+
+    parser = argparse.ArgumentParser(description="Build a contraction hierarchy for the loaded graph")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--output", help=f"default: {CH_NAME} in the data directory")
+    args = parser.parse_args()
+    build_and_save(Graph(data_dir=args.data_dir).csr, args.output or os.path.join(args.data_dir, CH_NAME))
+
+if __name__ == "__main__":
+    main()
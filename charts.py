@@ -63,4 +63,16 @@ ax2.legend(loc=1)
 
 plt.title("Optimality Plot for Manhattan Distance")
 plt.show()
-# %%
\ No newline at end of file
+# %%
+# %%
+# Benchmark report written by benchmark.py: median latency per engine and bucket
+benchmark_df = pd.read_csv('data/benchmark.csv')
+print(f"Printing benchmark results")
+print(benchmark_df)
+
+latency = benchmark_df.pivot(index='engine', columns='bucket', values='p50_ms')
+latency.plot.barh(logx=True)
+plt.xlabel('Median latency (ms)')
+plt.title("Benchmark Latency by Engine")
+plt.show()
+# %%
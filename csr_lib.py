@@ -0,0 +1,260 @@
+# Imports
+from array import array
+import threading
+from collections.abc import Mapping
+
+# Compressed sparse row (CSR) graph
+# Node ids are interned to int32 indices. The outgoing edges of node i are
+# targets[offsets[i]:offsets[i + 1]], and dists/costs line up with targets.
+class CSRGraph:
+    def __init__(self, node_ids: 'list[str]', offsets, targets, dists, costs, xs, ys, index: 'dict[str, int]' = None):
+        self.node_ids = node_ids
+        if index is None:
+            index = {node: i for i, node in enumerate(node_ids)}
+        self.index: dict[str, int] = index
+        self.offsets = offsets
+        self.targets = targets
+        self.dists = dists
+        self.costs = costs
+        self.xs = xs
+        self.ys = ys
+
+    # Build from the string keyed dictionaries used by Graph
+    @classmethod
+    def from_dicts(cls, adj_list: dict, coords: dict, dists: dict, costs: dict) -> 'CSRGraph':
+        # Nodes in adjacency order, then nodes that only appear as targets or coordinates
+        node_ids = list(adj_list)
+        seen = set(node_ids)
+        for adjacent_nodes in adj_list.values():
+            for node in adjacent_nodes:
+                if node not in seen:
+                    seen.add(node)
+                    node_ids.append(node)
+        for node in coords:
+            if node not in seen:
+                seen.add(node)
+                node_ids.append(node)
+        index = {node: i for i, node in enumerate(node_ids)}
+
+        offsets = array('i', [0])
+        targets = array('i')
+        edge_dists = array('d')
+        edge_costs = array('d')
+        for node_from in node_ids:
+            for node_to in adj_list.get(node_from, ()):
+                key = f"{node_from},{node_to}"
+                targets.append(index[node_to])
+                edge_dists.append(dists[key])
+                edge_costs.append(costs[key])
+            offsets.append(len(targets))
+
+        xs = array('d', bytes(8 * len(node_ids)))
+        ys = array('d', bytes(8 * len(node_ids)))
+        for node, (x, y) in coords.items():
+            i = index[node]
+            xs[i] = x
+            ys[i] = y
+
+        return cls(node_ids, offsets, targets, edge_dists, edge_costs, xs, ys, index)
+
+    def num_nodes(self) -> int:
+        return len(self.offsets) - 1
+
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    # Position of edge u -> v in targets, or -1 if there is no such edge
+    def edge_index(self, u: int, v: int) -> int:
+        targets = self.targets
+        for e in range(self.offsets[u], self.offsets[u + 1]):
+            if targets[e] == v:
+                return e
+        return -1
+
+    # Translate between string ids and int indices
+    def to_indices(self, path: 'list[str]') -> 'list[int]':
+        index = self.index
+        return [index[node] for node in path]
+
+    def to_ids(self, path: 'list[int]') -> 'list[str]':
+        node_ids = self.node_ids
+        return [node_ids[i] for i in path]
+
+    # Return (distance, cost) of a path given as int indices
+    def path_totals(self, path: 'list[int]') -> 'tuple[float, float]':
+        total_dist = 0.
+        total_cost = 0.
+        for u, v in zip(path, path[1:]):
+            e = self.edge_index(u, v)
+            total_dist += self.dists[e]
+            total_cost += self.costs[e]
+        return (total_dist, total_cost)
+
+    # Transposed adjacency for backward searches, built on first use and cached
+    def reverse(self) -> 'ReverseCSR':
+        reverse = self.__dict__.get("_reverse")
+        if reverse is None:
+            reverse = self._reverse = ReverseCSR(self)
+        return reverse
+
+
+# Incoming edges of node i are sources[offsets[i]:offsets[i + 1]]
+# edge_ids maps each of them back to the forward edge, to read dists/costs
+class ReverseCSR:
+    def __init__(self, csr: CSRGraph):
+        num_nodes = csr.num_nodes()
+        forward_offsets, forward_targets = csr.offsets, csr.targets
+
+        # Counting sort of the forward edges by target
+        offsets = array('i', bytes(4 * (num_nodes + 1)))
+        for v in forward_targets:
+            offsets[v + 1] += 1
+        for i in range(num_nodes):
+            offsets[i + 1] += offsets[i]
+
+        sources = array('i', bytes(4 * len(forward_targets)))
+        edge_ids = array('i', bytes(4 * len(forward_targets)))
+        fill_position = array('i', offsets[:-1])
+        for u in range(num_nodes):
+            for e in range(forward_offsets[u], forward_offsets[u + 1]):
+                v = forward_targets[e]
+                position = fill_position[v]
+                sources[position] = u
+                edge_ids[position] = e
+                fill_position[v] = position + 1
+
+        self.offsets = offsets
+        self.targets = sources
+        self.edge_ids = edge_ids
+
+
+# Attributes of a CSRGraph grouped by the data file / section they come from
+COMPONENTS = {
+    "adjacency": ("node_ids", "index", "offsets", "targets"),
+    "dists": ("dists",),
+    "costs": ("costs",),
+    "coords": ("xs", "ys"),
+}
+
+
+# Attribute that loads its component on first access
+# Loaded values are stored in the instance dict, which shadows this descriptor,
+# so later accesses cost the same as a plain attribute
+class LazyComponent:
+    def __init__(self, component: str):
+        self.component = component
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, csr, owner = None):
+        if csr is None:
+            return self
+        csr.load(self.component)
+        return csr.__dict__[self.name]
+
+
+# CSR graph whose components are loaded on demand by the _load_<component> methods of a subclass
+class LazyCSRGraph(CSRGraph):
+    node_ids = LazyComponent("adjacency")
+    index = LazyComponent("adjacency")
+    offsets = LazyComponent("adjacency")
+    targets = LazyComponent("adjacency")
+    dists = LazyComponent("dists")
+    costs = LazyComponent("costs")
+    xs = LazyComponent("coords")
+    ys = LazyComponent("coords")
+
+    def __init__(self):
+        self.loaded_components: set[str] = set()
+        self._locks = {component: threading.Lock() for component in COMPONENTS}
+
+    # Load a component once, safe to call from several threads
+    def load(self, component: str):
+        if component in self.loaded_components:
+            return
+        with self._locks[component]:
+            if component in self.loaded_components:
+                return
+            values = getattr(self, f"_load_{component}")()
+            if len(COMPONENTS[component]) == 1:
+                values = (values,)
+            for name, value in zip(COMPONENTS[component], values):
+                self.__dict__[name] = value
+            self.loaded_components.add(component)
+
+    # Load every component (or the given ones) now
+    def load_all(self, components = COMPONENTS):
+        for component in components:
+            self.load(component)
+
+
+# return traced and reversed path of int indices
+def trace_index_path(parent: 'dict[int, int]', start: int, end: int) -> 'list[int]':
+    path = [end]
+    while path[-1] != start:
+        path.append(parent[path[-1]])
+    path.reverse()
+    return path
+
+
+# Read-only dictionary views over a CSRGraph, so the string keyed Graph API
+# (adj_list, coords, dists, costs) keeps working without materialising dicts
+class AdjacencyView(Mapping):
+    def __init__(self, csr: CSRGraph):
+        self.csr = csr
+
+    def __getitem__(self, node: str) -> 'list[str]':
+        csr = self.csr
+        i = csr.index[node]
+        node_ids, targets = csr.node_ids, csr.targets
+        return [node_ids[targets[e]] for e in range(csr.offsets[i], csr.offsets[i + 1])]
+
+    def __iter__(self):
+        return iter(self.csr.node_ids)
+
+    def __len__(self) -> int:
+        return self.csr.num_nodes()
+
+
+class CoordinateView(Mapping):
+    def __init__(self, csr: CSRGraph):
+        self.csr = csr
+
+    def __getitem__(self, node: str) -> 'list[float, float]':
+        i = self.csr.index[node]
+        return [self.csr.xs[i], self.csr.ys[i]]
+
+    def __iter__(self):
+        return iter(self.csr.node_ids)
+
+    def __len__(self) -> int:
+        return self.csr.num_nodes()
+
+
+# Edge values keyed by "node_from,node_to" like Dist.json and Cost.json
+# values names the CSR attribute ("dists" or "costs") so lazy graphs only load it when read
+class EdgeValueView(Mapping):
+    def __init__(self, csr: CSRGraph, values: str):
+        self.csr = csr
+        self.values = values
+
+    def __getitem__(self, key: str) -> float:
+        node_from, _, node_to = key.partition(",")
+        index = self.csr.index
+        if node_from not in index or node_to not in index:
+            raise KeyError(key)
+        e = self.csr.edge_index(index[node_from], index[node_to])
+        if e < 0:
+            raise KeyError(key)
+        return getattr(self.csr, self.values)[e]
+
+    def __iter__(self):
+        csr = self.csr
+        node_ids, offsets, targets = csr.node_ids, csr.offsets, csr.targets
+        for i, node_from in enumerate(node_ids):
+            for e in range(offsets[i], offsets[i + 1]):
+                yield f"{node_from},{node_ids[targets[e]]}"
+
+    def __len__(self) -> int:
+        return self.csr.num_edges()
@@ -1,9 +1,29 @@
 # Imports
 import json
+import os
+from collections import OrderedDict
 
-from queue import PriorityQueue
 from math import radians, cos, sin, asin, sqrt
+import threading
 import time
+from time import perf_counter
+
+from alt_lib import ALT_NAME, LandmarkTables, build_tables, load_tables, save_tables
+from cache_lib import MISSING, QueryCache
+from ch_lib import CH_NAME, ContractionHierarchy, build_and_save, graph_fingerprint
+from csr_lib import COMPONENTS, CSRGraph, AdjacencyView, CoordinateView, EdgeValueView
+from ingest_lib import JSONGraph
+from larac_lib import larac_search
+from memory_lib import PeakMemory, graph_memory_report
+from rcsp_lib import constrained_search
+from search_lib import SearchResult, bidirectional_search, coordinate_heuristic, heuristic_table, search
+from snapshot_lib import SnapshotGraph, snapshot_is_fresh, snapshot_path
+from spatial_lib import KDTree
+
+# Coord.json holds longitude and latitude in millionths of a degree
+COORD_SCALE = 1e6
+# Coordinate heuristic tables kept per (target, dist_type), see Graph.heuristic
+HEURISTIC_TABLES = 8
 
 # Opens file and return data as a dictionary
 def load_json(file_name : str) -> dict:
@@ -12,7 +32,7 @@ def load_json(file_name : str) -> dict:
     return data_dict
 
 # return traced and reversed path
-def trace_path(parent, start, end, toPrint):
+def trace_path(parent, start, end, toPrint = False):
     path = [end]
     while path[-1] != start:
         path.append(parent[path[-1]])
@@ -30,35 +50,92 @@ def print_path(path: 'list[str]'):
 
 # Graph structure with helper functions
 class Graph:
-    def __init__(self, input_graph = None, input_coords = None, input_dists = None, input_cost = None):
+    # snapshot defaults to graph.snap in data_dir, "" never uses one
+    def __init__(self, input_graph = None, input_coords = None, input_dists = None, input_cost = None, snapshot: str = None,
+                 data_dir: str = "data"):
         # Load and initialize graph
+        self.previous_path = {}
+        self.path = []
+        # Contraction hierarchy and ALT landmark tables, loaded on first use
+        self.ch = None
+        self.landmarks = None
+        # Energy cost of each hierarchy edge, for bucket matrices
+        self.ch_costs = None
+        # Frontier used by the search engine: "heap", "indexed" or "radix" (see search_lib.py)
+        self.frontier = "heap"
+        # Query result cache, off until enable_cache() is called (see cache_lib.py)
+        self.cache = None
+        # SearchResult of the last route() call, with its counters and timings
+        self.result = None
+        # Unscaled coordinate heuristic tables by (target, dist_type), least recently used first
+        # None marks a target seen once, which does not get a table yet
+        self.heuristic_tables: OrderedDict = OrderedDict()
+        # Directory of the data files, None for a graph built from input dictionaries
+        self.data_dir = None
+        # KD-tree for snapping longitude/latitude to nodes, built on first use (see spatial_lib.py)
+        self.kdtree = None
 
         if input_graph == None or input_coords == None or input_dists == None or input_cost == None:
-            print(f"Initializing graph from data file")
-            print(f"Loading graph from G.json")
-            self.adj_list: dict = load_json("data/G.json")
-
-            print(f"Loading coordinates from Coord.json")
-            self.coords = load_json("data/Coord.json")
-
-            print(f"Loading distances from Dist.json")
-            self.dists = load_json("data/Dist.json")
-
-            print(f"Loading costs from Cost.json")
-            self.costs = load_json("data/Cost.json")
-
-            self.previous_path = {}
-            self.path = []
-            print(f"Graph initialized")
+            self.data_dir = data_dir
+            if snapshot is None:
+                snapshot = snapshot_path(data_dir)
+            #* Memory-map the compiled snapshot if it is up to date (see snapshot_lib.py)
+            if snapshot and snapshot_is_fresh(snapshot, data_dir):
+                print(f"Initializing graph from snapshot {snapshot}")
+                self.csr = SnapshotGraph(snapshot)
+            else:
+                #* Stream the JSON files straight into CSR arrays (see ingest_lib.py)
+                print(f"Initializing graph from data file")
+                self.csr = JSONGraph(data_dir)
+
+            # String keyed views over the CSR arrays
+            # Components (adjacency, dists, costs, coords) are only loaded on first access
+            self.adj_list = AdjacencyView(self.csr)
+            self.coords = CoordinateView(self.csr)
+            self.dists = EdgeValueView(self.csr, "dists")
+            self.costs = EdgeValueView(self.csr, "costs")
         else:
             print(f"Initializing test graph from inputs")
             self.adj_list = input_graph
             self.coords = input_coords
             self.dists = input_dists
             self.costs = input_cost
-            self.previous_path = {}
-            self.path = []
-            print(f"Graph initialized")    
+            self.csr = CSRGraph.from_dicts(self.adj_list, self.coords, self.dists, self.costs)
+
+        print(f"Graph initialized")
+
+    # Load graph components ahead of first use, optionally in a background thread
+    # Searches started meanwhile wait only for the components they touch
+    def preload(self, components = COMPONENTS, background: bool = False):
+        load_all = getattr(self.csr, "load_all", None)
+        if load_all is None:
+            return None
+        if not background:
+            load_all(components)
+            return None
+
+        # Progress lines would interleave with the menu, so background loads are silent
+        if hasattr(self.csr, "progress"):
+            self.csr.progress = None
+        thread = threading.Thread(target=load_all, args=(components,), daemon=True)
+        thread.start()
+        return thread
+
+    # Bytes held per component (adjacency, dists, costs, coords, reverse, landmarks,
+    # hierarchy, KD-tree, cache, last search), split into heap and snapshot-mapped bytes
+    # Only counts what is loaded, it never triggers a lazy load
+    def memory_report(self) -> 'dict[str, dict[str, int]]':
+        return graph_memory_report(self)
+
+    # Cache search results from now on, disk_file adds a persistent shelve tier
+    def enable_cache(self, max_entries: int = None, max_bytes: int = None, disk_file: str = None) -> QueryCache:
+        if self.cache is not None:
+            self.cache.close()
+        limits = {name: value for name, value in (("max_entries", max_entries), ("max_bytes", max_bytes)) if value is not None}
+        #! The fingerprint reads the whole graph, only the disk tier needs it
+        fingerprint = graph_fingerprint(self.csr) if disk_file else None
+        self.cache = QueryCache(disk_file=disk_file, fingerprint=fingerprint, **limits)
+        return self.cache
 
     # Get and return adjacent nodes as a list
     def get_adj_nodes(self, node: str) -> 'list[str]':
@@ -90,13 +167,8 @@ class Graph:
 
     # Return total distance of path
     def calculate_distance(self) -> float:
-        total_distance = 0
-        previous_node = self.path[0]
-        for node in self.path[1:]:
-            # Increment by previous node and next node
-            total_distance += self.get_distance(previous_node, node)
-            previous_node = node
-        
+        total_distance, _ = self.csr.path_totals(self.csr.to_indices(self.path))
+
         # Round off to 2 decimal points
         total_distance = round(total_distance, 2)
         print(f"Distance of path: {total_distance}")
@@ -104,18 +176,22 @@ class Graph:
 
     # Return total cost of path
     def calculate_cost(self) -> float:
-        total_cost = 0
-        previous_node = self.path[0]
-        for node in self.path[1:]:
-            # Increment by previous node and next node
-            total_cost += self.get_cost(previous_node, node)
-            previous_node = node
-        
+        _, total_cost = self.csr.path_totals(self.csr.to_indices(self.path))
+
         # Round off to 2 decimal points
         total_cost = round(total_cost, 2)
         print(f"Cost of path: {total_cost}")
         return total_cost
 
+    # Return (distance, cost) of a path of node ids
+    def path_totals(self, path: 'list[str]') -> 'tuple[float, float]':
+        total_distance = 0.
+        total_cost = 0.
+        for node_from, node_to in zip(path, path[1:]):
+            total_distance += self.get_distance(node_from, node_to)
+            total_cost += self.get_cost(node_from, node_to)
+        return (total_distance, total_cost)
+
     # Gets and return Euclidean distance (Bird's eye) between two nodes
     def get_euclidean_distance(self, node_from: str, node_to: str) -> float:
         x_from, y_from = self.get_coordinates(node_from)
@@ -132,95 +208,258 @@ class Graph:
         # Move by x_axis then by y_axis
         return abs(x_from - x_to) + abs(y_from - y_to)
 
+    # KD-tree over the node coordinates, x scaled by cos(latitude) so distances are about even in both axes
+    def load_kdtree(self) -> KDTree:
+        if self.kdtree is None:
+            ys = self.csr.ys
+            latitude = (min(ys) + max(ys)) / 2 / COORD_SCALE
+            self.kdtree = KDTree(self.csr.xs, ys, cos(radians(latitude)))
+        return self.kdtree
+
+    # Node nearest to a longitude/latitude in degrees
+    def nearest_node(self, longitude: float, latitude: float) -> str:
+        return self.csr.node_ids[self.load_kdtree().nearest(longitude * COORD_SCALE, latitude * COORD_SCALE)]
+
+    # Nearest node to each (longitude, latitude), or the k nearest nodes to each when k > 1
+    def nearest_nodes(self, points: 'list[tuple[float, float]]', k: int = 1) -> list:
+        node_ids = self.csr.node_ids
+        points = [(longitude * COORD_SCALE, latitude * COORD_SCALE) for longitude, latitude in points]
+        nearest = self.load_kdtree().nearest_many(points, k)
+        if k == 1:
+            return [node_ids[node] for node in nearest]
+        return [[node_ids[node] for node in nodes] for nodes in nearest]
+
+    # Node ids for nodes given as ids or (longitude, latitude) pairs, the pairs snapped to the nearest node
+    def resolve_nodes(self, *nodes) -> 'list[str]':
+        points = [node for node in nodes if not isinstance(node, str)]
+        if not points:
+            return list(nodes)
+        snapped = iter(self.nearest_nodes(points))
+        return [node if isinstance(node, str) else next(snapped) for node in nodes]
+
+    # ALT landmark tables, loaded from alt_file or built and saved there the first time
+    # (or when alt_file was built for a different graph)
+    # alt_file defaults to graph.alt in the data directory, graphs without one keep the tables in memory only
+    def load_landmarks(self, alt_file: str = None) -> LandmarkTables:
+        if self.landmarks is None:
+            alt_file = alt_file or self.data_file(ALT_NAME)
+            if alt_file and os.path.exists(alt_file):
+                try:
+                    self.landmarks = load_tables(self.csr, alt_file)
+                except ValueError as error:
+                    print(f"{error}, rebuilding it")
+            elif alt_file:
+                print(f"No landmark tables at {alt_file}, building them now")
+            if self.landmarks is None:
+                self.landmarks = build_tables(self.csr)
+                if alt_file:
+                    save_tables(self.landmarks, alt_file)
+        return self.landmarks
+
+    # Heuristic for a search from start to end (node indices), as a per-node table or a node -> estimate callable
+    # dist_type: "euclidean" / "manhattan" on coordinates, or "landmarks" for ALT (see alt_lib.py)
+    # backward=True estimates the distance from start instead, for bidirectional A*
+    # A coordinate table costs a pass over every node, more than a local search, so the
+    # first search towards a target computes the heuristic lazily per node. Repeated
+    # targets (multiplier sweeps, k-shortest paths) get an unscaled table, kept in a
+    # small LRU, with the multiplier applied where the value is read
+    def heuristic(self, start: int, end: int, dist_type: str, multiplier: float, backward: bool = False):
+        if not multiplier:
+            return None
+        if dist_type == "landmarks":
+            if backward:
+                return self.load_landmarks().heuristic(start, end, multiplier, backward=True)
+            return self.load_landmarks().heuristic(end, start, multiplier)
+
+        target = start if backward else end
+        key = (target, dist_type)
+        tables = self.heuristic_tables
+        if key not in tables:
+            tables[key] = None
+            if len(tables) > HEURISTIC_TABLES:
+                tables.popitem(last=False)
+            return coordinate_heuristic(self.csr, target, dist_type, multiplier)
+
+        tables.move_to_end(key)
+        table = tables[key]
+        if table is None:
+            table = tables[key] = heuristic_table(self.csr, target, dist_type)
+        #! Without numpy the "table" is the lazy callable
+        if callable(table):
+            return coordinate_heuristic(self.csr, target, dist_type, multiplier)
+        if multiplier == 1:
+            return table
+        return lambda node: table[node] * multiplier
+
+    # Shortest path as a SearchResult with counters and per-phase timings (see search_lib.py)
+    # Like every search method, start_node / end_node can also be (longitude, latitude) pairs in degrees
+    # dist_type None runs UCS, otherwise A* with graph.heuristic(dist_type, heuristic_multiplier)
+    # trace: optional trace(event, node, value) hook, see search_lib.search
+    # measure_memory: record the query's peak allocation in result.peak_memory (tracemalloc, slow)
+    def route(self, start_node: str, end_node: str, dist_type: str = None, heuristic_multiplier: float = 1.,
+              frontier = None, bidirectional: bool = False, trace = None, measure_memory: bool = False) -> SearchResult:
+        if measure_memory:
+            with PeakMemory() as peak:
+                result = self.route(start_node, end_node, dist_type, heuristic_multiplier, frontier, bidirectional, trace)
+            result.peak_memory = peak.peak
+            return result
+        start_node, end_node = self.resolve_nodes(start_node, end_node)
+        csr = self.csr
+        start, end = csr.index[start_node], csr.index[end_node]
+        heuristic_start = perf_counter()
+        heuristic = self.heuristic(start, end, dist_type, heuristic_multiplier) if dist_type else None
+        reverse_heuristic = None
+        if bidirectional and heuristic is not None:
+            reverse_heuristic = self.heuristic(start, end, dist_type, heuristic_multiplier, backward=True)
+        heuristic_seconds = perf_counter() - heuristic_start
+
+        if bidirectional:
+            result = bidirectional_search(csr, start, end, heuristic, reverse_heuristic, trace=trace)
+        else:
+            result = search(csr, start, end, heuristic, frontier or self.frontier, trace=trace)
+        result.timings["heuristic"] = heuristic_seconds
+        self.result = result
+        return result
+
     # A* Algorithm
-    def a_star_search(self, start_node: str, end_node: str, heuristic_multiplier, dist_type, print_path):
+    # bidirectional=True searches from both ends with an average potential (see search_lib.bidirectional_search)
+    def a_star_search(self, start_node: str, end_node: str, heuristic_multiplier, dist_type, print_path, frontier = None, bidirectional = False):
         start_time = time.time()
-        dist_tracker: dict[str, float] = {start_node: 0.}
-        heuristic_tracker: dict[str, float] = {start_node: 0.}
-        cost_tracker: dict[str, float] = {start_node: 0.}
-        p_queue = PriorityQueue()
-
-        # Enqueue starting node
-        p_queue.put((0, start_node))
-        self.previous_path = {}
-
-        while not p_queue.empty():
-            a_star_cost, current_node = p_queue.get()
-
-            # Stop searching if target node is found
-            if current_node == end_node:
-                self.path = trace_path(self.previous_path, start_node, end_node, print_path)
-
-                #return(self.path, dist_tracker[end_node], cost_tracker[end_node])
-                return (round(time.time() - start_time, 3), len(dist_tracker), round(dist_tracker[end_node], 3))
-
-            # Process adjacent nodes using cost function heuristic
-            adjacent_nodes = self.get_adj_nodes(current_node)
-            for adj_node in adjacent_nodes:
-                # Get new distance and cost
-                new_distance = dist_tracker[current_node] + self.get_distance(current_node, adj_node)
-                new_cost = cost_tracker[current_node] + self.get_cost(current_node, adj_node)
-
-                #! Heuristic
-                #* Euclidean distance (Bird's Eye / Pythagorean theorem)
-                if dist_type == "euclidean":
-                    herustic_cost = self.get_euclidean_distance(adj_node, end_node)
-
-                #* Manhattan distance (Grid Distance / x_coord distance + y_coord distance)
-                elif dist_type == "manhattan":
-                    herustic_cost = self.get_manhattan_distance(adj_node, end_node)
-
-                a_star_cost = new_distance + (herustic_cost * heuristic_multiplier)
-
-                # Check if first time visiting or adjusted distance is shorter than previous
-                if adj_node not in heuristic_tracker or a_star_cost < heuristic_tracker[adj_node]:
-                    dist_tracker[adj_node] = new_distance
-                    cost_tracker[adj_node] = new_cost
-                    heuristic_tracker[adj_node] = a_star_cost
-
-                    p_queue.put((a_star_cost, adj_node))
-
-                    # Add parent tracer
-                    self.previous_path[adj_node] = current_node
-
-        #! No path found            
-        return (round(time.time() - start_time, 3), len(dist_tracker), round(dist_tracker[end_node], 3))
+        start_node, end_node = self.resolve_nodes(start_node, end_node)
+        key = ("astar", start_node, end_node, dist_type, heuristic_multiplier, frontier or self.frontier, bidirectional)
+        cached = self.cache.get(key) if self.cache else MISSING
+        if cached is not MISSING:
+            path, nodes_explored, distance = cached
+            self.path = path or []
+            if print_path and path:
+                self.print_path()
+            return (round(time.time() - start_time, 3), nodes_explored, distance)
+
+        result = self.route(start_node, end_node, dist_type, heuristic_multiplier, frontier, bidirectional)
+        self.path = result.path or []
+        if print_path and result.found():
+            self.print_path()
+
+        #! No path found gives a distance of None
+        distance = round(result.distance, 3) if result.found() else None
+        if self.cache:
+            self.cache.put(key, (result.path, result.nodes_explored, distance))
+        return (round(time.time() - start_time, 3), result.nodes_explored, distance)
+
+    # Cache key of a ucs_search answer, the defaults give the key budgeted lookups reuse as the unconstrained optimum
+    def ucs_key(self, start_node: str, end_node: str, frontier = None, bidirectional = False) -> tuple:
+        return ("ucs", start_node, end_node, frontier or self.frontier, bidirectional)
 
     # Uniform Cost Search Algorithm
-    def ucs_search(self, start_node: str, end_node: str):
-        dist_tracker: dict[str, float] = {start_node: 0.}
-        cost_tracker: dict[str, float] = {start_node: 0.}
-        p_queue = PriorityQueue()
-
-        # Enqueue starting node
-        p_queue.put((0, start_node))
-        self.previous_path = {}
-
-        while not p_queue.empty():
-            distance, current_node = p_queue.get()
-
-            # Stop searching if target node is found
-            if current_node == end_node:
-                self.path = trace_path(self.previous_path, start_node, end_node)
-
-                return(self.path, dist_tracker[end_node], cost_tracker[end_node])
-
-            # Process adjacent nodes using cost function heuristic
-            adjacent_nodes = self.get_adj_nodes(current_node)
-            for adj_node in adjacent_nodes:
-                # Get new distance and cost
-                new_distance = dist_tracker[current_node] + self.get_distance(current_node, adj_node)
-                new_cost = cost_tracker[current_node] + self.get_cost(current_node, adj_node)
-
-                # Check if first time visiting or adjusted distance is shorter than previous
-                if adj_node not in dist_tracker or new_distance < dist_tracker[adj_node]:
-                    dist_tracker[adj_node] = new_distance
-                    cost_tracker[adj_node] = new_cost
-
-                    p_queue.put((new_distance, adj_node))
-
-                    # Add parent tracer
-                    self.previous_path[adj_node] = current_node
-
-        #! No path found            
-        return None
\ No newline at end of file
+    def ucs_search(self, start_node: str, end_node: str, frontier = None, bidirectional = False):
+        start_node, end_node = self.resolve_nodes(start_node, end_node)
+        key = self.ucs_key(start_node, end_node, frontier, bidirectional)
+        cached = self.cache.get(key) if self.cache else MISSING
+        if cached is not MISSING:
+            if cached:
+                self.path = cached[0]
+            return cached
+
+        result = self.route(start_node, end_node, frontier=frontier, bidirectional=bidirectional)
+
+        #! No path found
+        answer = (result.path, result.distance, result.cost) if result.found() else None
+        if self.cache:
+            self.cache.put(key, answer)
+        if answer is None:
+            return None
+
+        self.path = result.path
+        return answer
+
+    # Exact energy constrained shortest path, label-setting with Pareto dominance (see rcsp_lib.py)
+    # dist_type adds a coordinate heuristic, otherwise an exact reverse distance bound is used
+    # Cached answers are reused across budgets, and a cached unconstrained optimum within budget is the answer
+    def constrained_search(self, start_node: str, end_node: str, budget: float, dist_type = None, heuristic_multiplier = 1.):
+        start_node, end_node = self.resolve_nodes(start_node, end_node)
+        key = ("exact", start_node, end_node, dist_type, heuristic_multiplier)
+        cached = self.cache.get_budgeted(key, budget, self.ucs_key(start_node, end_node)) if self.cache else MISSING
+        if cached is not MISSING:
+            if cached:
+                self.path = cached[0]
+            return cached
+
+        csr = self.csr
+        end = csr.index[end_node]
+        start = csr.index[start_node]
+        heuristic = self.heuristic(start, end, dist_type, heuristic_multiplier) if dist_type else None
+        result = constrained_search(csr, start, end, budget, heuristic)
+
+        #! No path within budget
+        answer = (result.path, result.distance, result.cost) if result.found() else None
+        if self.cache:
+            self.cache.put_budgeted(key, budget, answer)
+        if answer is None:
+            return None
+
+        self.path = result.path
+        return answer
+
+    # Near-optimal energy constrained shortest path by Lagrangian relaxation (see larac_lib.py)
+    # Returns a LaracResult with the path, its lower bound and optimality gap, or None
+    def larac_search(self, start_node: str, end_node: str, budget: float, gap_tolerance: float = 0.):
+        start_node, end_node = self.resolve_nodes(start_node, end_node)
+        result = larac_search(self, start_node, end_node, budget, gap_tolerance)
+        if result:
+            self.path = result.path
+        return result
+
+    # Path of a preprocessing file next to the graph's JSON files, None for graphs built from dictionaries
+    def data_file(self, name: str) -> str:
+        return os.path.join(self.data_dir, name) if self.data_dir else None
+
+    # Contraction hierarchy, loaded from ch_file or built and saved there the first time
+    # (or when ch_file was built for a different graph)
+    # ch_file defaults to graph.ch in the data directory, graphs without one keep it in memory only
+    def load_hierarchy(self, ch_file: str = None) -> ContractionHierarchy:
+        if self.ch is None:
+            ch_file = ch_file or self.data_file(CH_NAME)
+            if ch_file and os.path.exists(ch_file):
+                try:
+                    self.ch = ContractionHierarchy.load(self.csr, ch_file)
+                except ValueError as error:
+                    print(f"{error}, rebuilding it")
+            elif ch_file:
+                print(f"No contraction hierarchy at {ch_file}, building it now")
+            if self.ch is None:
+                self.ch = build_and_save(self.csr, ch_file)
+        return self.ch
+
+    # Shortest path on the contraction hierarchy (see ch_lib.py)
+    def ch_search(self, start_node: str, end_node: str, ch_file: str = None):
+        start_node, end_node = self.resolve_nodes(start_node, end_node)
+        csr = self.csr
+        result = self.load_hierarchy(ch_file).query(csr.index[start_node], csr.index[end_node])
+
+        #! No path found
+        if not result.found():
+            return None
+
+        self.path = result.path
+        return (self.path, result.distance, result.cost)
+
+    # Origin x destination matrices of shortest distance and its energy cost, as numpy arrays (see matrix_lib.py)
+    # method: "one_to_many" runs one Dijkstra per origin, stopping at the last destination
+    #         "buckets" runs bucket-based many-to-many on the contraction hierarchy, for large destination sets
+    # Returns (distances, energies), inf where a destination cannot be reached
+    def distance_matrix(self, origins: 'list[str]', destinations: 'list[str]', method: str = "one_to_many",
+                        ch_file: str = None):
+        #* numpy is only needed for matrices
+        from matrix_lib import bucket_matrix, hierarchy_costs, one_to_many_matrix
+
+        csr = self.csr
+        origins, destinations = self.resolve_nodes(*origins), self.resolve_nodes(*destinations)
+        sources, targets = csr.to_indices(origins), csr.to_indices(destinations)
+        if method == "one_to_many":
+            return one_to_many_matrix(csr, sources, targets)
+        if method == "buckets":
+            ch = self.load_hierarchy(ch_file)
+            if self.ch_costs is None:
+                self.ch_costs = hierarchy_costs(ch)
+            return bucket_matrix(ch, sources, targets, self.ch_costs)
+        raise ValueError(f"Unknown matrix method {method}, expected one_to_many or buckets")
@@ -0,0 +1,196 @@
+# Imports
+import codecs
+import json
+import os
+import time
+from array import array
+
+from csr_lib import CSRGraph, LazyCSRGraph
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789.eE+-"
+
+_decoder = json.JSONDecoder()
+
+
+# Default progress callback, prints a single updating line per file
+def print_progress(file_name: str, bytes_read: int, total_bytes: int):
+    percent = 100 * bytes_read // total_bytes if total_bytes else 100
+    end = "\n" if bytes_read >= total_bytes else ""
+    print(f"\rLoading {os.path.basename(file_name)}: {percent}%", end=end, flush=True)
+
+
+# Stream (key, value) pairs out of a file holding one top-level JSON object
+# Only the current chunk and the item being decoded are held in memory
+def iter_json_object(file_name: str, progress = print_progress, chunk_size: int = CHUNK_SIZE):
+    total_bytes = os.path.getsize(file_name)
+    bytes_read = 0
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    with open(file_name, 'rb') as file:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        # Append the next chunk, dropping what has already been consumed
+        def fill():
+            nonlocal buffer, pos, eof, bytes_read
+            chunk = file.read(chunk_size)
+            bytes_read += len(chunk)
+            eof = not chunk
+            buffer = buffer[pos:] + decoder.decode(chunk, final=eof)
+            pos = 0
+            if progress and chunk:
+                progress(file_name, bytes_read, total_bytes)
+
+        # Skip whitespace and return the next significant character
+        def peek() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if eof:
+                    raise ValueError(f"Unexpected end of {file_name}")
+                fill()
+
+        # Decode one complete JSON value at the current position
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = _decoder.raw_decode(buffer, pos)
+                    # A number cut off by the end of the chunk may continue in the next one
+                    if eof or (end < len(buffer) and buffer[end] not in NUMBER_CHARS):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        if peek() != "{":
+            raise ValueError(f"{file_name} does not contain a JSON object")
+        pos += 1
+
+        while True:
+            char = peek()
+            if char == "}":
+                return
+            if char == ",":
+                pos += 1
+                continue
+            key = decode()
+            if peek() != ":":
+                raise ValueError(f"Expected ':' after key {key!r} in {file_name}")
+            pos += 1
+            peek()
+            yield key, decode()
+
+
+# Stream G.json into (node_ids, index, offsets, targets)
+# Rows are kept in file order, then scattered into CSR order once every node is known
+def read_adjacency(file_name: str, progress = print_progress):
+    index: dict[str, int] = {}
+    node_ids: list[str] = []
+
+    def intern(node: str) -> int:
+        i = index.get(node)
+        if i is None:
+            i = index[node] = len(node_ids)
+            node_ids.append(node)
+        return i
+
+    row_nodes = array('i')
+    row_ends = array('i')
+    raw_targets = array('i')
+    for node_from, adjacent_nodes in iter_json_object(file_name, progress):
+        row_nodes.append(intern(node_from))
+        raw_targets.extend(intern(node_to) for node_to in adjacent_nodes)
+        row_ends.append(len(raw_targets))
+
+    num_nodes = len(node_ids)
+    offsets = array('i', bytes(4 * (num_nodes + 1)))
+    for r, node in enumerate(row_nodes):
+        row_start = row_ends[r - 1] if r else 0
+        offsets[node + 1] += row_ends[r] - row_start
+    for i in range(num_nodes):
+        offsets[i + 1] += offsets[i]
+
+    targets = array('i', bytes(4 * len(raw_targets)))
+    fill_position = array('i', offsets[:-1])
+    for r, node in enumerate(row_nodes):
+        row_start = row_ends[r - 1] if r else 0
+        e = fill_position[node]
+        targets[e:e + row_ends[r] - row_start] = raw_targets[row_start:row_ends[r]]
+        fill_position[node] = e + row_ends[r] - row_start
+
+    return node_ids, index, offsets, targets
+
+
+# Stream Coord.json into (xs, ys) aligned with the node indices
+# Nodes without any edge in G.json cannot be routed through and are skipped
+def read_coordinates(csr: CSRGraph, file_name: str, progress = print_progress):
+    index = csr.index
+    xs = array('d', bytes(8 * len(index)))
+    ys = array('d', bytes(8 * len(index)))
+    for node, (x, y) in iter_json_object(file_name, progress):
+        i = index.get(node)
+        if i is not None:
+            xs[i] = x
+            ys[i] = y
+    return xs, ys
+
+
+# Stream an edge keyed JSON file into a float array aligned with csr.targets
+def read_edge_values(csr: CSRGraph, file_name: str, progress = print_progress) -> array:
+    index, offsets, targets = csr.index, csr.offsets, csr.targets
+    values = array('d', [float("nan")]) * csr.num_edges()
+    for key, value in iter_json_object(file_name, progress):
+        node_from, _, node_to = key.partition(",")
+        u = index.get(node_from)
+        v = index.get(node_to)
+        if u is None or v is None:
+            continue
+        # Fill every parallel copy of the edge
+        for e in range(offsets[u], offsets[u + 1]):
+            if targets[e] == v:
+                values[e] = value
+    return values
+
+
+# CSR graph over the JSON data files, each file is streamed in on first access
+class JSONGraph(LazyCSRGraph):
+    def __init__(self, data_dir: str = "data", progress = print_progress):
+        super().__init__()
+        self.data_dir = data_dir
+        self.progress = progress
+
+    def _load_adjacency(self):
+        return read_adjacency(os.path.join(self.data_dir, "G.json"), self.progress)
+
+    def _load_coords(self):
+        return read_coordinates(self, os.path.join(self.data_dir, "Coord.json"), self.progress)
+
+    def _load_dists(self):
+        return read_edge_values(self, os.path.join(self.data_dir, "Dist.json"), self.progress)
+
+    def _load_costs(self):
+        return read_edge_values(self, os.path.join(self.data_dir, "Cost.json"), self.progress)
+
+
+# Build a CSR graph from G/Coord/Dist/Cost.json without holding any of them as a dict
+# Edges are written straight into typed arrays, so peak memory stays close to the final graph
+def build_csr_streaming(data_dir: str = "data", progress = print_progress) -> CSRGraph:
+    graph = JSONGraph(data_dir, progress)
+    graph.load_all()
+    return graph
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    csr = build_csr_streaming()
+    print(f"{csr.num_nodes()} nodes, {csr.num_edges()} edges")
+    print(f"Time elapsed: {round(time.time() - start_time, 2)} seconds.")
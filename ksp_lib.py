@@ -0,0 +1,122 @@
+# Imports
+import heapq
+from functools import partial
+from itertools import count, repeat
+
+from pool_lib import graph_pool, worker_graph
+from search_lib import search
+
+# Yen's k shortest loopless paths without touching the graph
+# Spur searches skip root path nodes and already used spur edges through per-query
+# blocked sets, so one Graph can be shared between threads.
+#   - candidates sit in a heap keyed by distance, with a set of seen paths for dedup
+#   - accepted paths go into a prefix trie, so the edges to block at a spur node are
+#     found by walking the trie instead of comparing every accepted path
+#   - a path only spurs from its deviation index onwards (Lawler), earlier spur nodes
+#     would rebuild candidates its parent already produced
+# Paths are produced lazily, in non-decreasing distance.
+
+
+# Prefix trie of accepted paths, children of the node for a root path are the blocked next hops
+class PathTrie:
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, path: 'list[int]'):
+        level = self.root
+        for node in path:
+            level = level.setdefault(node, {})
+
+
+# Shortest path from path[i] to end avoiding path[:i] and the given next hops out of path[i]
+# Returns (index path, distance) or None
+def spur_search(csr, end: int, heuristic, frontier: str, path: 'list[int]', i: int, next_hops: 'list[int]'):
+    spur_node = path[i]
+    blocked_edges = {(spur_node, next_node) for next_node in next_hops}
+    result = search(csr, spur_node, end, heuristic, frontier, blocked_nodes=set(path[:i]), blocked_edges=blocked_edges)
+    if not result.found():
+        return None
+    return (result.index_path, result.distance)
+
+
+# Heuristic of the last query a worker saw, as (query, heuristic)
+worker_heuristic = (None, None)
+
+
+# spur_search inside a pool worker, the heuristic is rebuilt there since closures do not pickle
+# query: (start, end, heuristic arguments or None, frontier)
+def spur_task(query: tuple, path: 'list[int]', i: int, next_hops: 'list[int]'):
+    global worker_heuristic
+    graph = worker_graph()
+    start, end, heuristic_args, frontier = query
+    if worker_heuristic[0] != query:
+        heuristic = graph.heuristic(start, end, *heuristic_args) if heuristic_args else None
+        worker_heuristic = (query, heuristic)
+    return spur_search(graph.csr, end, worker_heuristic[1], frontier, path, i, next_hops)
+
+
+# graph: Graph, astar uses graph.heuristic(dist_type, heuristic_multiplier) towards end_node
+# workers > 1 runs the spur searches of each path on a process pool (see pool_lib.py),
+# results are merged in spur order so the paths come out the same as with one worker
+# Yields (path, distance, cost) tuples
+def k_shortest_paths(graph, start_node: str, end_node: str, astar: bool = True, heuristic_multiplier: float = 0.86,
+                     dist_type: str = "manhattan", frontier = None, workers: int = 1):
+    csr = graph.csr
+    dists = csr.dists
+    start, end = csr.index[start_node], csr.index[end_node]
+    heuristic_args = (dist_type, heuristic_multiplier) if astar else None
+    heuristic = graph.heuristic(start, end, *heuristic_args) if astar else None
+    frontier = frontier or graph.frontier
+    query = (start, end, heuristic_args, frontier)
+
+    first = search(csr, start, end, heuristic, frontier)
+    if not first.found():
+        return
+
+    accepted = PathTrie()
+    seen = {tuple(first.index_path)}
+    tie_breaker = count()
+    # (distance, tie breaker, index path, deviation index)
+    candidates = [(first.distance, next(tie_breaker), first.index_path, 0)]
+
+    pool = graph_pool(graph, workers) if workers > 1 else None
+    try:
+        while candidates:
+            distance, _, path, deviation = heapq.heappop(candidates)
+            accepted.insert(path)
+            yield (csr.to_ids(path), *csr.path_totals(path))
+
+            # Spur nodes from the deviation index on, with every next hop an accepted path
+            # sharing the same root already took
+            spur_indices = []
+            spur_next_hops = []
+            level = accepted.root
+            for i in range(len(path) - 1):
+                level = level[path[i]]
+                if i >= deviation:
+                    spur_indices.append(i)
+                    spur_next_hops.append(list(level))
+
+            if pool:
+                chunk_size = max(1, len(spur_indices) // (4 * workers))
+                spurs = pool.map(spur_task, repeat(query), repeat(path), spur_indices, spur_next_hops, chunksize=chunk_size)
+            else:
+                spurs = map(partial(spur_search, csr, end, heuristic, frontier, path), spur_indices, spur_next_hops)
+
+            # Distance along the path up to each node
+            root_distances = [0.]
+            for u, v in zip(path, path[1:]):
+                root_distances.append(root_distances[-1] + dists[csr.edge_index(u, v)])
+
+            for i, spur in zip(spur_indices, spurs):
+                if spur is None:
+                    continue
+                spur_path, spur_distance = spur
+                total_path = path[:i] + spur_path
+                key = tuple(total_path)
+                if key not in seen:
+                    seen.add(key)
+                    heapq.heappush(candidates, (root_distances[i] + spur_distance, next(tie_breaker), total_path, i))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
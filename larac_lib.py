@@ -0,0 +1,77 @@
+# Imports
+from search_lib import search
+
+# Lagrangian relaxation (LARAC) for energy budgeted routing
+# Runs UCS on the combined weight distance + multiplier * cost, moving the multiplier
+# between the best infeasible (short) and best feasible (cheap) path found so far.
+# Every combined search also gives a lower bound on the constrained optimum:
+#   min over paths of (distance + multiplier * cost) - multiplier * budget
+# so the answer comes with an optimality gap, and a gap tolerance can stop it early.
+
+
+# Best feasible path with its lower bound and relative gap
+class LaracResult:
+    def __init__(self, path: 'list[str]', distance: float, cost: float, lower_bound: float, multiplier: float, iterations: int):
+        self.path = path
+        self.distance = distance
+        self.cost = cost
+        self.lower_bound = lower_bound
+        self.gap = (distance - lower_bound) / distance if distance else 0.
+        self.multiplier = multiplier
+        self.iterations = iterations
+
+
+# graph: Graph, path totals are read back through get_distance / get_cost
+# gap_tolerance: stop once (distance - lower_bound) / distance is at most this
+def larac_search(graph, start_node: str, end_node: str, budget: float, gap_tolerance: float = 0.,
+                 max_iterations: int = 50, frontier = None) -> LaracResult:
+    csr = graph.csr
+    start, end = csr.index[start_node], csr.index[end_node]
+
+    # UCS on one weighting, returns (path, distance, cost) or None
+    def shortest(weights: str = "dists", multiplier: float = 0.):
+        result = search(csr, start, end, frontier=frontier or graph.frontier,
+                        weights=weights, cost_multiplier=multiplier)
+        if not result.found():
+            return None
+        distance, cost = graph.path_totals(result.path)
+        return (result.path, distance, cost)
+
+    #! No path at all
+    short_path = shortest()
+    if short_path is None:
+        return None
+
+    # Unconstrained optimum already within budget
+    if short_path[2] <= budget:
+        return LaracResult(short_path[0], short_path[1], short_path[2], short_path[1], 0., 1)
+
+    #! Even the minimum energy path is over budget
+    cheap_path = shortest("costs")
+    if cheap_path[2] > budget:
+        return None
+
+    lower_bound = short_path[1]
+    multiplier = 0.
+    iterations = 2
+    while iterations < max_iterations:
+        if (cheap_path[1] - lower_bound) <= gap_tolerance * cheap_path[1]:
+            break
+
+        # Multiplier at which both paths have the same combined weight
+        multiplier = (cheap_path[1] - short_path[1]) / (short_path[2] - cheap_path[2])
+        path = shortest(multiplier=multiplier)
+        iterations += 1
+
+        combined = path[1] + multiplier * path[2]
+        lower_bound = max(lower_bound, combined - multiplier * budget)
+
+        # No path beats the current pair at this multiplier, it is optimal for the relaxation
+        if combined >= (cheap_path[1] + multiplier * cheap_path[2]) * (1 - 1e-12):
+            break
+        if path[2] <= budget:
+            cheap_path = path
+        else:
+            short_path = path
+
+    return LaracResult(cheap_path[0], cheap_path[1], cheap_path[2], min(lower_bound, cheap_path[1]), multiplier, iterations)
@@ -1,9 +1,13 @@
 # Imports
 import time
-from queue import PriorityQueue
 
 from graph_lib import Graph
+from cache_lib import MISSING
+from ksp_lib import k_shortest_paths
+from memory_lib import format_memory_report
+from pool_lib import default_workers
 from pygame_lib import Window
+from search_lib import search
 
 def backtrace(parent, start, end):
     path = [end]
@@ -21,150 +25,84 @@ def print_path(path: 'list[str]'):
     print("T")
 
 
-def astar_start(graph, start: str, end: str, heuristic):
-    dist_so_far: dict[str, float] = {start: 0.}
-    astar_cost_so_far: dict[str, float] = {start: 0.}
-    energy_cost_so_far: dict[str, float] = {start: 0.}
-    queue = PriorityQueue()
-    queue.put((0, start))
-    came_from = {}
-
-    while not queue.empty():
-        curr_node = queue.get()[1]
-
-        # stop if the current node is the end node
-        if curr_node == end:
-            path = backtrace(came_from, start, end)
-            return (path, dist_so_far[end], energy_cost_so_far[end])
-
-        # add adjacent nodes by cost function
-        adjacent_nodes = graph.get_adj_nodes(curr_node)
-        for adjacent_node in adjacent_nodes:
-            new_dist = dist_so_far[curr_node] + graph.get_distance(curr_node, adjacent_node)
-            new_energy_cost = energy_cost_so_far[curr_node] + graph.get_cost(curr_node, adjacent_node)
-
-            # heuristic_cost = graph.get_euclidean_distance(adjacent_node, end)
-            heuristic_cost = graph.get_manhattan_distance(adjacent_node, end)
-            new_astar_cost = new_dist + heuristic_cost * heuristic
-
-            # add adjacent nodes if new node or overall cost is lower than previously calculated cost
-            if adjacent_node not in astar_cost_so_far or new_astar_cost < astar_cost_so_far[adjacent_node]:
-                dist_so_far[adjacent_node] = new_dist
-                energy_cost_so_far[adjacent_node] = new_energy_cost
-                astar_cost_so_far[adjacent_node] = new_astar_cost
-                queue.put((new_astar_cost, adjacent_node))
-                came_from[adjacent_node] = curr_node
-    return None
+# Convert blocked string nodes/edges to index sets on the CSR graph
+def blocked_indices(csr, blocked_nodes, blocked_edges):
+    index = csr.index
+    nodes = {index[node] for node in blocked_nodes} if blocked_nodes else set()
+    edges = {(index[u], index[v]) for u, v in blocked_edges} if blocked_edges else set()
+    return nodes, edges
 
 
-def ucs_dist_start(graph, start, end):
-    # initialisation
-    energy_cost_so_far: dict[str, float] = {start: 0.}
-    dist_so_far: dict[str, float] = {start: 0.}
-    queue = PriorityQueue()
-    queue.put((0, start))
-    came_from = {}
-
-    while len(queue.queue) > 0:
-        curr_node = queue.get()[1]
-
-        # stop if the current node is the end node
-        if curr_node == end:
-            path = backtrace(came_from, start, end)
-            return (path, dist_so_far[end], energy_cost_so_far[end])
-
-        # add adjacent nodes by distance
-        adjacent_nodes = graph.get_adj_nodes(curr_node)
-        for adjacent_node in adjacent_nodes:
-            new_dist = dist_so_far[curr_node] + graph.get_distance(curr_node, adjacent_node)
-            new_energy_cost = energy_cost_so_far[curr_node] + graph.get_cost(curr_node, adjacent_node)
-
-            # add adjacent nodes if new node or overall dist is lower than previously calculated dist
-            if adjacent_node not in dist_so_far or new_dist < dist_so_far[adjacent_node]:
-                dist_so_far[adjacent_node] = new_dist
-                energy_cost_so_far[adjacent_node] = new_energy_cost
-                queue.put((new_dist, adjacent_node))
-                # add parent pointers
-                came_from[adjacent_node] = curr_node
-    return None
+def astar_start(graph, start: str, end: str, heuristic, blocked_nodes=None, blocked_edges=None, frontier=None):
+    csr = graph.csr
+    removed_nodes, removed_edges = blocked_indices(csr, blocked_nodes, blocked_edges)
+    end_idx = csr.index[end]
+
+    start_idx = csr.index[start]
+
+    # astar_heuristic = graph.heuristic(start_idx, end_idx, "euclidean", heuristic)
+    astar_heuristic = graph.heuristic(start_idx, end_idx, "manhattan", heuristic)
+    result = search(csr, start_idx, end_idx, astar_heuristic, frontier or graph.frontier,
+                    blocked_nodes=removed_nodes, blocked_edges=removed_edges)
+
+    if not result.found():
+        return None
+    return (result.path, result.distance, result.cost)
+
+
+def ucs_dist_start(graph, start, end, blocked_nodes=None, blocked_edges=None, frontier=None):
+    csr = graph.csr
+    removed_nodes, removed_edges = blocked_indices(csr, blocked_nodes, blocked_edges)
+
+    result = search(csr, csr.index[start], csr.index[end], frontier=frontier or graph.frontier,
+                    blocked_nodes=removed_nodes, blocked_edges=removed_edges)
+
+    if not result.found():
+        return None
+    return (result.path, result.distance, result.cost)
+
 
+def yen_algo_mod(graph, start, end, budget, astar=True, workers=1):
+    # k-shortest paths in order of distance (see ksp_lib.py), the graph is never modified
+    # workers > 1 spreads the spur searches of each path over a process pool
+    # With graph.cache on, answers are reused across budgets (see cache_lib.py)
+    key = ("yen", start, end, astar)
+    cached = graph.cache.get_budgeted(key, budget, None if astar else graph.ucs_key(start, end)) if graph.cache else MISSING
+    if cached is not MISSING:
+        if cached is None:
+            print("No path found within budget")
+            return None
+        print_path(cached[0])
+        print("Total distance: ", cached[1])
+        print("Total cost: ", cached[2])
+        return cached
 
-def yen_algo_mod(graph, start, end, budget, astar=True):
-    
-    # ucs/astar returns path, distance, and energy_cost
-    if astar:
-        shortest_path = astar_start(graph, start, end, 0.86)
-    else:
-        shortest_path = ucs_dist_start(graph, start, end)
-    
-    # A stores k-shortest paths
-    A = [shortest_path]
-    # B stores list of potential k-shortest paths
-    B = []
-    k = 1
-    while True:
+    for k, shortest_path in enumerate(k_shortest_paths(graph, start, end, astar=astar, workers=workers), start=1):
         print("finding ", k, " shortest path")
-        # kmos => k-1 shortest path
-        kmos_path = A[-1][0]
-        for i in range(len(kmos_path) - 1):
-            spur_node = kmos_path[i]
-            root_path = kmos_path[:i+1]
-
-            # prevent generation of the same path by removing edge of root path that coincides with previous paths
-            original_adjacent_nodes = graph.adj_list[spur_node]
-            new_adjacent_nodes = list(original_adjacent_nodes)
-            for path in A:
-                path = path[0]
-                if len(path) > i and root_path == path[:i+1]:
-                    to_be_deleted_node = path[i + 1]
-                    if to_be_deleted_node in new_adjacent_nodes:
-                        new_adjacent_nodes.remove(to_be_deleted_node)
-            graph.adj_list[spur_node] = new_adjacent_nodes
-
-            # remove nodes from the root path except for the spur node
-            removed_nodes = []
-            for node in root_path[0][:-1]:
-                removed_node = graph.adj_list.pop(node)
-                removed_nodes.append(removed_node)
-
-            # find the shortest path from spur node to terminal node
-            if astar:
-                returned_values = astar_start(graph, spur_node, end, 0.86)
-            else:
-                returned_values = ucs_dist_start(graph, spur_node, end)
-
-            if returned_values:
-                spur_path, spur_dist, spur_energy_cost = returned_values
-
-                # calculate the values of the generated path by combining the root and spur paths
-                total_path = root_path[:-1] + spur_path
-                total_dist, total_cost = calc_costs(total_path, graph)
-                potential_k = (total_path, total_dist, total_cost)
-
-                # add the newly generated path to the array
-                if potential_k not in B:
-                    B.append(potential_k)
-
-            # Add the edges and nodes back
-            graph.adj_list[spur_node] = original_adjacent_nodes
-            for node, removed_node in zip(root_path[:-1], removed_nodes):
-                graph.adj_list[node] = removed_node
-
-        # handles the exception when there are no potential paths
-        if not B:
-            continue
-        # sort the potential k-shortest paths by distance
-        B.sort(key=lambda b: b[1])
-        # let the lowest cost path become the k-shortest path
-        next_shortest_path = B.pop(0)
-        if next_shortest_path[2] <= budget:
-            print_path(next_shortest_path[0])
-            print("Total distance: ", next_shortest_path[1])
-            print("Total cost: ", next_shortest_path[2])
-            return next_shortest_path
-
-        A.append(next_shortest_path)
-        k += 1
+        # let the first path within budget be the answer
+        if shortest_path[2] <= budget:
+            print_path(shortest_path[0])
+            print("Total distance: ", shortest_path[1])
+            print("Total cost: ", shortest_path[2])
+            if graph.cache:
+                graph.cache.put_budgeted(key, budget, shortest_path)
+            return shortest_path
+
+    # handles the exception when there are no potential paths
+    print("No path found within budget")
+    if graph.cache:
+        graph.cache.put_budgeted(key, budget, None)
+    return None
+
+# Read a node id, or a "longitude,latitude" in degrees snapped to the nearest node
+def read_node(graph: Graph, prompt: str) -> str:
+    text = input(prompt).strip()
+    if "," not in text:
+        return text
+    longitude, latitude = (float(value) for value in text.split(","))
+    node = graph.nearest_node(longitude, latitude)
+    print(f"Nearest node to {longitude}, {latitude} is {node}")
+    return node
 
 def calc_costs(x:str, g: Graph):
     total_cost = 0.
@@ -181,6 +119,10 @@ def calc_costs(x:str, g: Graph):
 
 def main():
     graph = Graph()
+    # Keep loading graph components while the menu waits for input
+    graph.preload(background=True)
+    # Repeated queries (e.g. the same pair with another budget) are answered from the cache
+    graph.enable_cache()
     window = Window(graph)
     while(True):
             print()
@@ -190,11 +132,24 @@ def main():
             print(f" ~~ BONUS ~~")
             print(f"4) Task 2x: Energy constrained shortest path (UCS + modification)")
             print(f"5) Task 3x: Energy Constrained shortest path w/ Heuristic (A* + modification)")
+            print(f"6) Task 2e: Exact energy constrained shortest path (label-setting)")
+            print(f"M) Memory used by the graph, by component")
+            print(f"F) Fast-forward visualisation (only draw the final frontier and path): {'on' if window.fast_forward else 'off'}")
             choice = input("What would you like to do (X to exit): ")
 
             if choice.upper() == 'X':
+                stats = graph.cache.stats()
+                print(f"Cache: {stats['hits']} hits ({stats['budget_hits']} across budgets), {stats['misses']} misses")
                 break
 
+            if choice.upper() == 'M':
+                print(format_memory_report(graph.memory_report()))
+                continue
+
+            if choice.upper() == 'F':
+                window.fast_forward = not window.fast_forward
+                continue
+
             try:
                 choice = int(choice)
             except:
@@ -202,15 +157,16 @@ def main():
                 continue
             
             try:
-                start_node = input("Enter starting node: ")
-                end_node = input("Enter ending node: ")
+                start_node = read_node(graph, "Enter starting node (or longitude,latitude): ")
+                end_node = read_node(graph, "Enter ending node (or longitude,latitude): ")
 
-                if (choice >= 2 and choice <= 5):
+                if (choice >= 2 and choice <= 6):
                     budget = int(input("Enter energy budget: "))
 
                 if (choice == 3 or choice == 5):
                     print("E: Euclidean (Pythagorean theorem aka Bird's Eye Distance)")
                     print("M: Manhattan (x_coord distance + y_coord distance aka Grid Distance)")
+                    print("L: Landmarks (ALT lower bounds on road distance, multiplier 1 stays exact)")
                     dist_choice = input("Select type of distance heuristic: ")
                     dist_choice = dist_choice.upper()
 
@@ -218,6 +174,8 @@ def main():
                         dist_type = "euclidean"
                     elif dist_choice == 'M': 
                         dist_type = "manhattan"
+                    elif dist_choice == 'L':
+                        dist_type = "landmarks"
                     else: 
                         print("Invalid distance type")
                         continue
@@ -243,13 +201,24 @@ def main():
 
             elif choice == 4:
                 start_time = time.time()
-                yen_algo_mod(graph, start_node, end_node, budget, astar=False)
+                yen_algo_mod(graph, start_node, end_node, budget, astar=False, workers=default_workers())
                 end_time = time.time()
                 print(f"Time elapsed: {round(end_time - start_time, 2)}")
             elif choice == 5:
                 start_time = time.time()
-                yen_algo_mod(graph, start_node, end_node, budget, astar=True)
+                yen_algo_mod(graph, start_node, end_node, budget, astar=True, workers=default_workers())
+                end_time = time.time()
+                print(f"Time elapsed: {round(end_time - start_time, 2)}")
+            elif choice == 6:
+                start_time = time.time()
+                result = graph.constrained_search(start_node, end_node, budget)
                 end_time = time.time()
+                if result:
+                    print_path(result[0])
+                    print("Total distance: ", result[1])
+                    print("Total cost: ", result[2])
+                else:
+                    print("No path found within budget")
                 print(f"Time elapsed: {round(end_time - start_time, 2)}")
             else:
                 print("Invalid choice")
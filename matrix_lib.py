@@ -0,0 +1,124 @@
+# Imports
+import heapq
+from array import array
+from math import inf
+
+import numpy as np
+
+from ch_lib import ContractionHierarchy
+from csr_lib import CSRGraph
+
+# Origin x destination matrices of shortest distance and the energy cost of that path
+# Unreachable pairs hold inf in both matrices.
+#   one_to_many: one Dijkstra per origin, stopped once every destination is settled
+#   buckets:     many-to-many on the contraction hierarchy (Knopp et al.), one upward
+#                search per destination fills per-node buckets, then one upward search
+#                per origin scans the buckets it meets. Each side only explores its small
+#                upward search space, so large destination sets stay cheap.
+
+
+# Dijkstra from source until every node in targets is settled
+# Returns {target: (distance, cost)} for the reachable targets
+def one_to_many(csr: CSRGraph, source: int, targets) -> 'dict[int, tuple[float, float]]':
+    offsets, adjacent, dists, costs = csr.offsets, csr.targets, csr.dists, csr.costs
+    remaining = set(targets)
+    dist = {source: 0.}
+    cost = {source: 0.}
+    settled = {}
+    heap = [(0., source)]
+    while heap and remaining:
+        current_distance, current_node = heapq.heappop(heap)
+        if current_distance > dist[current_node]:
+            continue
+        if current_node in remaining:
+            remaining.discard(current_node)
+            settled[current_node] = (current_distance, cost[current_node])
+
+        current_cost = cost[current_node]
+        for e in range(offsets[current_node], offsets[current_node + 1]):
+            adj_node = adjacent[e]
+            new_distance = current_distance + dists[e]
+            if adj_node not in dist or new_distance < dist[adj_node]:
+                dist[adj_node] = new_distance
+                cost[adj_node] = current_cost + costs[e]
+                heapq.heappush(heap, (new_distance, adj_node))
+    return settled
+
+
+def one_to_many_matrix(csr: CSRGraph, sources: 'list[int]', targets: 'list[int]') -> 'tuple[np.ndarray, np.ndarray]':
+    distances = np.full((len(sources), len(targets)), np.inf)
+    energies = np.full((len(sources), len(targets)), np.inf)
+    # A destination can appear in several columns
+    columns: dict[int, list[int]] = {}
+    for j, target in enumerate(targets):
+        columns.setdefault(target, []).append(j)
+
+    for i, source in enumerate(sources):
+        for target, (distance, cost) in one_to_many(csr, source, columns).items():
+            distances[i, columns[target]] = distance
+            energies[i, columns[target]] = cost
+    return distances, energies
+
+
+# Energy cost of every up / down edge of the hierarchy, shortcuts unpacked to original edges
+def hierarchy_costs(ch: ContractionHierarchy) -> 'tuple[array, array]':
+    csr = ch.csr
+    up_costs = array('d')
+    for u in range(ch.num_nodes):
+        for e in range(ch.up_offsets[u], ch.up_offsets[u + 1]):
+            up_costs.append(csr.path_totals(ch.unpack([u, ch.up_targets[e]]))[1])
+    down_costs = array('d')
+    for w in range(ch.num_nodes):
+        for e in range(ch.down_offsets[w], ch.down_offsets[w + 1]):
+            down_costs.append(csr.path_totals(ch.unpack([ch.down_sources[e], w]))[1])
+    return up_costs, down_costs
+
+
+# Full Dijkstra over one direction of the hierarchy, returns {node: (distance, cost)}
+def upward_search(offsets, adjacent, weights, edge_costs, source: int) -> 'dict[int, tuple[float, float]]':
+    dist = {source: 0.}
+    cost = {source: 0.}
+    settled = {}
+    heap = [(0., source)]
+    while heap:
+        current_distance, current_node = heapq.heappop(heap)
+        if current_distance > dist[current_node]:
+            continue
+        current_cost = cost[current_node]
+        settled[current_node] = (current_distance, current_cost)
+        for e in range(offsets[current_node], offsets[current_node + 1]):
+            adj_node = adjacent[e]
+            new_distance = current_distance + weights[e]
+            if adj_node not in dist or new_distance < dist[adj_node]:
+                dist[adj_node] = new_distance
+                cost[adj_node] = current_cost + edge_costs[e]
+                heapq.heappush(heap, (new_distance, adj_node))
+    return settled
+
+
+# edge_costs: hierarchy_costs(ch), computed once and reused across calls
+def bucket_matrix(ch: ContractionHierarchy, sources: 'list[int]', targets: 'list[int]',
+                  edge_costs = None) -> 'tuple[np.ndarray, np.ndarray]':
+    up_costs, down_costs = edge_costs or hierarchy_costs(ch)
+    distances = np.full((len(sources), len(targets)), np.inf)
+    energies = np.full((len(sources), len(targets)), np.inf)
+
+    # node -> [(column, distance to target, cost to target)]
+    buckets: dict[int, list] = {}
+    for j, target in enumerate(targets):
+        for node, (distance, cost) in upward_search(ch.down_offsets, ch.down_sources, ch.down_weights,
+                                                    down_costs, target).items():
+            buckets.setdefault(node, []).append((j, distance, cost))
+
+    for i, source in enumerate(sources):
+        row_distances = [inf] * len(targets)
+        row_energies = [inf] * len(targets)
+        for node, (distance, cost) in upward_search(ch.up_offsets, ch.up_targets, ch.up_weights,
+                                                    up_costs, source).items():
+            for j, target_distance, target_cost in buckets.get(node, ()):
+                if distance + target_distance < row_distances[j]:
+                    row_distances[j] = distance + target_distance
+                    row_energies[j] = cost + target_cost
+        distances[i] = row_distances
+        energies[i] = row_energies
+    return distances, energies
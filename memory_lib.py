@@ -0,0 +1,138 @@
+# Imports
+import sys
+import tracemalloc
+
+# Memory accounting
+# Graph.memory_report() breaks the graph's footprint down by component. Each component
+# reports heap bytes (Python objects and arrays) and mapped bytes (snapshot sections,
+# which live in the OS page cache and are shared between processes).
+# PeakMemory measures the peak allocation of a block (one query) with tracemalloc.
+
+
+# Size of obj and everything it references, counting shared objects once
+# Arrays count their buffer, memoryviews over an mmap are left to mapped_bytes()
+def deep_size(obj, seen: set = None) -> int:
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, memoryview):
+            total += sys.getsizeof(current)
+            continue
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+    return total
+
+
+# Bytes of memoryviews among values (snapshot sections)
+def mapped_bytes(*values) -> int:
+    return sum(value.nbytes for value in values if isinstance(value, memoryview))
+
+
+# Heap and mapped bytes of a group of values
+def measure(*values, seen: set = None) -> 'dict[str, int]':
+    return {"heap": sum(deep_size(value, seen) for value in values), "mapped": mapped_bytes(*values)}
+
+
+# Breakdown by component of a Graph, only counting what is already loaded
+def graph_memory_report(graph) -> 'dict[str, dict[str, int]]':
+    report = {}
+    csr = graph.csr
+    # Components of a lazy graph sit in the instance dict once loaded, reading them here never loads
+    loaded = csr.__dict__
+    seen = set()
+
+    if isinstance(graph.adj_list, dict):
+        # Test graph built from input dictionaries
+        report["input_dicts"] = measure(graph.adj_list, graph.coords, graph.dists, graph.costs, seen=seen)
+
+    if "offsets" in loaded:
+        report["adjacency"] = measure(loaded["offsets"], loaded["targets"], loaded["node_ids"], loaded["index"], seen=seen)
+    if "dists" in loaded:
+        report["dists"] = measure(loaded["dists"], seen=seen)
+    if "costs" in loaded:
+        report["costs"] = measure(loaded["costs"], seen=seen)
+    if "xs" in loaded:
+        report["coords"] = measure(loaded["xs"], loaded["ys"], seen=seen)
+
+    reverse = loaded.get("_reverse")
+    if reverse is not None:
+        report["reverse"] = measure(reverse.offsets, reverse.targets, reverse.edge_ids, seen=seen)
+    if graph.landmarks is not None:
+        report["landmarks"] = measure(graph.landmarks.forward, graph.landmarks.reverse, seen=seen)
+    if graph.ch is not None:
+        from ch_lib import CH_SECTIONS
+        report["hierarchy"] = measure(*(getattr(graph.ch, name) for name, _ in CH_SECTIONS), graph.ch_costs, seen=seen)
+    if graph.kdtree is not None:
+        report["kdtree"] = measure(graph.kdtree.xs, graph.kdtree.ys, graph.kdtree.order, seen=seen)
+    if graph.cache is not None:
+        # Pickled size of the cached results, which is what the cache bounds
+        report["cache"] = {"heap": graph.cache.total_bytes, "mapped": 0}
+    if graph.result is not None:
+        report["last_result"] = measure(graph.result.dist, graph.result.parent, graph.result.index_path,
+                                        graph.result.path, seen=seen)
+    report["path_state"] = measure(graph.path, graph.previous_path, seen=seen)
+
+    report["total"] = {
+        "heap": sum(row["heap"] for row in report.values()),
+        "mapped": sum(row["mapped"] for row in report.values()),
+    }
+    return report
+
+
+# Human readable MB table
+def format_memory_report(report: 'dict[str, dict[str, int]]') -> str:
+    lines = [f"{'Component':<14}{'Heap MB':>12}{'Mapped MB':>12}"]
+    for component, row in report.items():
+        lines.append(f"{component:<14}{row['heap'] / 2 ** 20:>12.2f}{row['mapped'] / 2 ** 20:>12.2f}")
+    return "\n".join(lines)
+
+
+# Peak bytes allocated inside a with block, above what was allocated on entry
+# Starts tracemalloc if it is not already tracing, and stops it again on exit
+class PeakMemory:
+    def __init__(self):
+        self.peak = None
+
+    def __enter__(self) -> 'PeakMemory':
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc_info):
+        self.peak = tracemalloc.get_traced_memory()[1] - self.baseline
+        if self.started:
+            tracemalloc.stop()
+        return False
+
+
+def main():
+    import argparse
+    from graph_lib import Graph
+
+    parser = argparse.ArgumentParser(description="Print the memory footprint of the loaded graph by component")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--query", nargs=2, metavar=("START", "END"), help="also measure one UCS query's peak allocation")
+    args = parser.parse_args()
+
+    graph = Graph(data_dir=args.data_dir)
+    graph.preload()
+    if args.query:
+        result = graph.route(*args.query, measure_memory=True)
+        print(f"Query {args.query[0]} -> {args.query[1]}: peak {result.peak_memory / 2 ** 20:.2f} MB, "
+              f"{result.nodes_settled} nodes settled")
+    print(format_memory_report(graph.memory_report()))
+
+if __name__ == "__main__":
+    main()
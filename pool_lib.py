@@ -0,0 +1,44 @@
+# Imports
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pools sharing one read-only graph
+# Where fork is available workers inherit the parent's loaded Graph: the CSR arrays and
+# snapshot mappings are shared copy-on-write and never written to, so nothing is copied.
+# Elsewhere each worker opens the same snapshot, which maps the shared page cache
+# instead of parsing the JSON files again.
+shared_graph = None
+
+
+# Open the graph in a spawned worker
+def init_worker(snapshot_file: str, data_dir: str):
+    global shared_graph
+    if shared_graph is None:
+        from graph_lib import Graph
+        shared_graph = Graph(snapshot=snapshot_file, data_dir=data_dir)
+
+
+# Graph of the current process, inside a pool worker
+def worker_graph():
+    return shared_graph
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+# Pool of workers that all see graph as worker_graph()
+def graph_pool(graph, workers: int = None) -> ProcessPoolExecutor:
+    global shared_graph
+    # Load every component first, so workers never repeat it and no load lock is held while forking
+    graph.preload()
+    shared_graph = graph
+    workers = workers or default_workers()
+    if "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+
+    #! Without fork, workers need the graph on disk as a snapshot (see snapshot_lib.py)
+    snapshot_file = getattr(graph.csr, "file_name", None)
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker, initargs=(snapshot_file, graph.data_dir))
@@ -1,13 +1,17 @@
 #library courtesy of Richard
 
 # Imports
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from operator import is_
 import sys
 import time
-import pygame
 
-from queue import PriorityQueue
 from graph_lib import Graph
+from search_lib import search
+from spatial_lib import GridIndex, edge_span
 
 # pygame constants
 WINDOW_SIZE = (WIDTH, HEIGHT) = 512, 512
@@ -20,17 +24,205 @@ COLORS = {
 }
 
 # coordinate limits for NYC dataset
+# Windows take their bounds from the loaded graph, these remain the reference bounds
+# for generated data (see synthetic_lib.py)
 min_x = -74499998
 max_x = -73500016
 min_y = 40300009
 max_y = 41299997
 
-w_scale = WIDTH / ((-73500016) - (-74499998))
-h_scale = HEIGHT / (41299997 - 40300009)
-
-# scale dataset to fit Window
-def scale_coordinate(coord: 'list[float, float]'):
-    return [(coord[0] - min_x) * w_scale, (coord[1] - min_y) * h_scale]
+# Viewport: fraction of the view one arrow key pans, zoom factor per key or wheel step,
+# deepest zoom relative to the whole map, and the margin (fraction of the start/end
+# span on each side) and smallest span (fraction of the map) of the query view
+PAN_STEP = 0.25
+ZOOM_STEP = 2.
+MAX_ZOOM = 256.
+QUERY_MARGIN = 0.5
+MIN_QUERY_SPAN = 0.02
+# How long the result stays up, counted from the last pan or zoom
+RESULT_SECONDS = 5
+
+# Search animation: frames per second, and event kinds the search thread emits
+TARGET_FPS = 30
+SETTLE, RELAX = 0, 1
+
+# pygame is imported on first render, so the menu and non visual tasks never load it
+pygame = None
+
+def load_pygame():
+    global pygame
+    if pygame is None:
+        import pygame as pygame_module
+        pygame = pygame_module
+    return pygame
+
+# Region of the map shown in the window, stretched to fill it like the original NYC scaling
+class Viewport:
+    def __init__(self, min_x: float, max_x: float, min_y: float, max_y: float):
+        self.min_x, self.max_x, self.min_y, self.max_y = min_x, max_x, min_y, max_y
+        self.width = (max_x - min_x) or 1.
+        self.height = (max_y - min_y) or 1.
+        self.w_scale = WIDTH / self.width
+        self.h_scale = HEIGHT / self.height
+
+    # scale dataset to fit Window
+    def scale(self, coord: 'list[float, float]'):
+        return [(coord[0] - self.min_x) * self.w_scale, (coord[1] - self.min_y) * self.h_scale]
+
+    # Map coordinates of a window pixel
+    def unscale(self, pixel: 'tuple[int, int]') -> 'tuple[float, float]':
+        return (self.min_x + pixel[0] / self.w_scale, self.min_y + pixel[1] / self.h_scale)
+
+    def box(self) -> 'tuple[float, float, float, float]':
+        return (self.min_x, self.max_x, self.min_y, self.max_y)
+
+    def centre(self) -> 'tuple[float, float]':
+        return ((self.min_x + self.max_x) / 2, (self.min_y + self.max_y) / 2)
+
+    # factor > 1 zooms in, keeping centre (default the middle of the view) at the same pixel
+    def zoom(self, factor: float, centre: 'tuple[float, float]' = None) -> 'Viewport':
+        cx, cy = centre or self.centre()
+        return Viewport(cx - (cx - self.min_x) / factor, cx + (self.max_x - cx) / factor,
+                        cy - (cy - self.min_y) / factor, cy + (self.max_y - cy) / factor)
+
+    # Move by a fraction of the view's width and height
+    def pan(self, fx: float, fy: float) -> 'Viewport':
+        dx, dy = fx * self.width, fy * self.height
+        return Viewport(self.min_x + dx, self.max_x + dx, self.min_y + dy, self.max_y + dy)
+
+    # View of points with a margin, at least MIN_QUERY_SPAN of this view and with its proportions
+    def around(self, points: 'list[tuple[float, float]]') -> 'Viewport':
+        xs = [point[0] for point in points]
+        ys = [point[1] for point in points]
+        width = max((max(xs) - min(xs)) * (1 + 2 * QUERY_MARGIN), self.width * MIN_QUERY_SPAN)
+        height = max((max(ys) - min(ys)) * (1 + 2 * QUERY_MARGIN), self.height * MIN_QUERY_SPAN)
+        ratio = self.height / self.width
+        if height < width * ratio:
+            height = width * ratio
+        else:
+            width = height / ratio
+        cx, cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+        return Viewport(cx - width / 2, cx + width / 2, cy - height / 2, cy + height / 2)
+
+    # Names the rendered view in base map file names
+    def key(self) -> str:
+        return hashlib.sha256(repr((WINDOW_SIZE, self.box())).encode()).hexdigest()[:8]
+
+# Base map
+# The static map (nodes and edges in red) is rasterised into a Surface once per view
+# and blitted in one call. With numpy, coordinates are scaled in one pass and edges
+# are rasterised as pixel runs written straight into the Surface's pixel array,
+# instead of one pygame.draw call per node and edge.
+# Zoomed views only draw what the spatial index (see spatial_lib.py) finds in the view,
+# so their cost tracks what is visible. The whole-map Surface is also saved as a PNG
+# named after the graph checksum and view, so later runs only load the image.
+BASE_MAP_PREFIX = "basemap"
+
+
+# Checksum of what the map shows, the snapshot checksum when there is one
+def map_checksum(csr) -> str:
+    checksum = getattr(csr, "checksum", None)
+    if checksum:
+        return checksum
+    sha = hashlib.sha256()
+    for name in ("offsets", "targets", "xs", "ys"):
+        sha.update(memoryview(getattr(csr, name)).cast('B'))
+    return sha.hexdigest()
+
+
+# Window pixels of nodes (a numpy index array) as numpy arrays, truncated like pygame.draw does with float positions
+def pixel_coordinates(csr, view: Viewport, nodes):
+    import numpy as np
+
+    xs = np.floor((np.frombuffer(csr.xs, dtype=np.float64)[nodes] - view.min_x) * view.w_scale).astype(np.int64)
+    ys = np.floor((np.frombuffer(csr.ys, dtype=np.float64)[nodes] - view.min_y) * view.h_scale).astype(np.int64)
+    return xs, ys
+
+
+# Write colour at pixels (px, py), skipping those outside the window
+def plot_pixels(surface, px, py, colour: 'tuple[int, int, int]'):
+    inside = (px >= 0) & (px < WIDTH) & (py >= 0) & (py < HEIGHT)
+    pixels = pygame.surfarray.pixels3d(surface)
+    pixels[px[inside], py[inside]] = colour
+    #! The pixel array locks the Surface until it is released
+    del pixels
+
+
+# Nodes at pixels (x, y) as the 2x2 block pygame.draw.circle gives at radius 1, in one numpy write
+def plot_nodes(surface, x, y, colour: 'tuple[int, int, int]'):
+    import numpy as np
+
+    plot_pixels(surface, np.concatenate((x, x - 1, x, x - 1)), np.concatenate((y, y, y - 1, y - 1)), colour)
+
+
+# Nodes (every node when None) and their outgoing edges drawn on surface, vectorised with numpy
+def rasterise_map(csr, surface, view: Viewport, nodes = None):
+    import numpy as np
+
+    offsets = np.asarray(csr.offsets, dtype=np.int64)
+    if nodes is None:
+        nodes = np.arange(len(offsets) - 1)
+    else:
+        nodes = np.asarray(nodes, dtype=np.int64)
+    first_edges = offsets[nodes]
+    counts = offsets[nodes + 1] - first_edges
+    sources = np.repeat(nodes, counts)
+    edges = np.repeat(first_edges - (np.cumsum(counts) - counts), counts) + np.arange(len(sources))
+    targets = np.asarray(csr.targets, dtype=np.int64)[edges]
+
+    # One pixel per step along the longer axis of each edge, like a DDA line
+    x0, y0 = pixel_coordinates(csr, view, sources)
+    x1, y1 = pixel_coordinates(csr, view, targets)
+    dx, dy = x1 - x0, y1 - y0
+    steps = np.maximum(np.abs(dx), np.abs(dy)) + 1
+    edge = np.repeat(np.arange(len(steps)), steps)
+    step = np.arange(len(edge)) - np.repeat(np.cumsum(steps) - steps, steps)
+    fraction = step / np.maximum(steps - 1, 1)[edge]
+    px = np.rint(x0[edge] + fraction * dx[edge]).astype(np.int64)
+    py = np.rint(y0[edge] + fraction * dy[edge]).astype(np.int64)
+    plot_pixels(surface, px, py, COLORS["RED"])
+    plot_nodes(surface, *pixel_coordinates(csr, view, nodes), COLORS["RED"])
+
+
+# Same picture with pygame.draw, when numpy is not installed
+# Coordinates are still scaled once per node rather than once per edge end
+def draw_map(csr, surface, view: Viewport, nodes = None):
+    nodes = range(csr.num_nodes()) if nodes is None else nodes
+    xs, ys, offsets, targets = csr.xs, csr.ys, csr.offsets, csr.targets
+    for node in nodes:
+        point = view.scale((xs[node], ys[node]))
+        pygame.draw.circle(surface, COLORS["RED"], point, 1)
+        for edge in range(offsets[node], offsets[node + 1]):
+            target = targets[edge]
+            pygame.draw.line(surface, COLORS["RED"], point, view.scale((xs[target], ys[target])))
+
+
+# Map Surface for view, with every node or only nodes
+def render_map(csr, view: Viewport, nodes = None):
+    surface = pygame.Surface(WINDOW_SIZE)
+    surface.fill(COLORS["WHITE"])
+    try:
+        import numpy
+    except ImportError:
+        draw_map(csr, surface, view, nodes)
+    else:
+        rasterise_map(csr, surface, view, nodes)
+    return surface
+
+
+# Whole map Surface for view, loaded from map_dir if saved there before, else rendered (and saved)
+def load_base_map(csr, view: Viewport, map_dir: str = None):
+    map_file = None
+    if map_dir:
+        map_file = os.path.join(map_dir, f"{BASE_MAP_PREFIX}-{map_checksum(csr)[:16]}-{view.key()}.png")
+        if os.path.exists(map_file):
+            return pygame.image.load(map_file)
+
+    surface = render_map(csr, view)
+    if map_file:
+        os.makedirs(map_dir, exist_ok=True)
+        pygame.image.save(surface, map_file)
+    return surface
 
 # return path trace and reverse to display path from start to terminal node
 def trace_path(parent, start, end):
@@ -50,433 +242,280 @@ def print_path(path: 'list[str]'):
 
 class Window:
     # Window constructor
-    def __init__(self, graph):
+    # save_map keeps the rendered whole map as a PNG in the graph's data directory
+    # fps: search animation frame rate, fast_forward skips the animation and only
+    # draws the final frontier and the path
+    # zoom_to_query opens each query zoomed to its start and end nodes. Arrow keys pan,
+    # +/- and the mouse wheel zoom, 0 shows the whole map and Z the query again
+    def __init__(self, graph, save_map: bool = True, fps: int = TARGET_FPS, fast_forward: bool = False,
+                 zoom_to_query: bool = True):
         self.graph = graph
         self.window = None
+        self.font = None
+        self.save_map = save_map
+        self.fps = fps
+        self.fast_forward = fast_forward
+        self.zoom_to_query = zoom_to_query
+        # Spatial index and edge extent for culling, whole map view and its Surface, built on first setup
+        self.index = None
+        self.span = None
+        self.full_view = None
+        self.base_map = None
+        # Current view and its map Surface
+        self.view = None
+        self.view_map = None
+        # What is drawn over the map, replayed when the view changes:
+        # (node indices, colour) batches, the path, the endpoints and a message
+        self.layers = []
+        self.path = None
+        self.endpoints = None
+        self.message = None
 
     # Draw node on window
     def draw_node(self, coord: 'list[float, float]', colour: 'tuple[int, int, int]' = COLORS["RED"], size: int = 1):
-        scaled_coord = scale_coordinate(coord)
+        scaled_coord = self.view.scale(coord)
         pygame.draw.circle(self.window, colour, scaled_coord, size)
 
     # Draw edge between two nodes
     def draw_edge(self, node_from: str, node_to: str, colour: 'tuple[int, int, int]' = COLORS["RED"]):
         node_from_coord = self.graph.get_coordinates(node_from)
-        scaled_node_from_coord = scale_coordinate(node_from_coord)
+        scaled_node_from_coord = self.view.scale(node_from_coord)
         node_to_coord = self.graph.get_coordinates(node_to)
-        scaled_node_to_coord = scale_coordinate(node_to_coord)
+        scaled_node_to_coord = self.view.scale(node_to_coord)
         pygame.draw.line(self.window, colour, scaled_node_from_coord, scaled_node_to_coord)
 
-    # Relaxed shortest distance with no energy constraint, using Uniform Cost Search
-    def relaxed_shortest_distance(self, start_node, end_node):
+    # Draw node indices in one batch
+    def draw_nodes(self, nodes, colour: 'tuple[int, int, int]'):
+        csr = self.graph.csr
+        try:
+            import numpy as np
+        except ImportError:
+            for node in nodes:
+                pygame.draw.circle(self.window, colour, self.view.scale((csr.xs[node], csr.ys[node])), 1)
+            return
+        plot_nodes(self.window, *pixel_coordinates(csr, self.view, np.fromiter(nodes, dtype=np.int64)), colour)
+
+    # Draw start/end vertices with their labels
+    def draw_endpoints(self, start_node: str, end_node: str):
+        for node in (start_node, end_node):
+            coord = self.graph.get_coordinates(node)
+            self.draw_node(coord, COLORS["BLACK"], 3)
+            label = self.font.render(node, False, COLORS["BLACK"], COLORS["WHITE"])
+            self.window.blit(label, self.view.scale(coord))
+
+    # Spatial index over the graph's coordinates, and the whole map view from its bounds
+    def load_index(self):
+        csr = self.graph.csr
+        self.index = GridIndex(csr.xs, csr.ys)
+        self.span = edge_span(csr)
+        # A small border keeps nodes on the edge of the data fully visible
+        min_x, max_x, min_y, max_y = self.index.bounds()
+        border_x, border_y = 0.01 * ((max_x - min_x) or 1.), 0.01 * ((max_y - min_y) or 1.)
+        self.full_view = Viewport(min_x - border_x, max_x + border_x, min_y - border_y, max_y + border_y)
+
+    # Show view: the saved whole map, or only the nodes and edges the index finds in view
+    def set_view(self, view: Viewport):
+        self.view = view
+        if view is self.full_view:
+            if self.base_map is None:
+                self.base_map = load_base_map(self.graph.csr, view, self.graph.data_dir if self.save_map else None)
+            self.view_map = self.base_map
+            return
+        # Edges can reach into the view from a node up to one edge span outside it
+        span_x, span_y = self.span
+        nodes = self.index.query(view.min_x - span_x, view.max_x + span_x, view.min_y - span_y, view.max_y + span_y)
+        self.view_map = render_map(self.graph.csr, view, nodes)
+
+    # View around the endpoints, the whole map when that would be larger
+    def query_view(self) -> Viewport:
+        view = self.full_view.around([self.graph.get_coordinates(node) for node in self.endpoints])
+        return self.full_view if view.width >= self.full_view.width else view
+
+    # Zoom by factor, kept between the whole map and MAX_ZOOM
+    def zoom(self, factor: float, centre: 'tuple[float, float]' = None) -> Viewport:
+        factor = min(factor, self.view.width * MAX_ZOOM / self.full_view.width)
+        factor = max(factor, self.view.width / self.full_view.width)
+        return self.view.zoom(factor, centre)
+
+    # Map, layers, path, endpoints and message for the current view
+    def redraw(self):
+        self.window.blit(self.view_map, (0, 0))
+        for nodes, colour in self.layers:
+            self.draw_nodes(nodes, colour)
+        if self.path:
+            node_from = self.path[0]
+            for node_to in self.path[1:]:
+                self.draw_node(self.graph.get_coordinates(node_to), COLORS["GREEN"])
+                self.draw_edge(node_from, node_to, COLORS["GREEN"])
+                node_from = node_to # Process next in path
+        self.draw_endpoints(*self.endpoints)
+        if self.message:
+            label_text = self.font.render(self.message, False, COLORS["BLACK"], COLORS["WHITE"])
+            label_frame = label_text.get_rect(center = (WIDTH / 2, HEIGHT / 2))
+            self.window.blit(label_text, label_frame)
+        pygame.display.flip() #Update display
+
+    # Quit, pan and zoom, returns whether the view changed
+    def handle_events(self) -> bool:
+        view = None
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.MOUSEWHEEL:
+                view = self.zoom(ZOOM_STEP ** event.y, self.view.unscale(pygame.mouse.get_pos()))
+            elif event.type == pygame.KEYDOWN:
+                view = self.key_view(event.key) or view
+            if view is not None:
+                self.set_view(view)
+        if view is None:
+            return False
+        self.redraw()
+        return True
+
+    # New view for a key press, None for keys that do nothing
+    def key_view(self, key: int):
+        pans = {pygame.K_LEFT: (-PAN_STEP, 0), pygame.K_RIGHT: (PAN_STEP, 0),
+                pygame.K_UP: (0, -PAN_STEP), pygame.K_DOWN: (0, PAN_STEP)}
+        if key in pans:
+            return self.view.pan(*pans[key])
+        if key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            return self.zoom(ZOOM_STEP)
+        if key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            return self.zoom(1 / ZOOM_STEP)
+        if key in (pygame.K_0, pygame.K_HOME):
+            return self.full_view
+        if key == pygame.K_z:
+            return self.query_view()
+        return None
+
+    # Keep the window up for seconds after the last pan or zoom
+    def wait(self, seconds: float):
+        clock = pygame.time.Clock()
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            if self.handle_events():
+                deadline = time.time() + seconds
+            clock.tick(self.fps)
+
+    # Open the window on the query (or the whole map) with the map drawn
+    def setup(self, start_node: str, end_node: str):
+        load_pygame()
         pygame.init()
 
-        font = pygame.font.SysFont("monospace", 15)
+        self.font = pygame.font.SysFont("monospace", 15)
         self.window = pygame.display.set_mode(WINDOW_SIZE)
         pygame.display.set_caption("Search Path Graph Visualization")
 
-        is_searching = True
-        is_setup = True # To run setup once
-
-        # Setup initialization
-        cost_tracker: dict[str, float] = {start_node: 0.}
-        dist_tracker: dict[str, float] = {start_node: 0.}
-
-        p_queue = PriorityQueue()
-
-        # Enqueue starting node
-        p_queue.put((0, start_node))
-
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-        
-            # Draw start and end vertices
-            start_coord = self.graph.get_coordinates(start_node)
-            self.draw_node(start_coord, COLORS["BLACK"], 3)
-            start_label = font.render(start_node, False, COLORS["BLACK"], COLORS["WHITE"])
-            scaled_coords = scale_coordinate(start_coord)
-    
-            self.window.blit(start_label, scaled_coords)
-
-            end_coord = self.graph.get_coordinates(end_node)
-            self.draw_node(end_coord, COLORS["BLACK"], 3)
-            end_label = font.render(end_node, False, COLORS["BLACK"], COLORS["WHITE"])
-            self.window.blit(end_label, scale_coordinate(end_coord))
-
-            # Run once to render start
-            if is_setup:
-                self.window.fill(COLORS["WHITE"])
-                # Draw every node
-                for _, coordinate in self.graph.coords.items():
-                    self.draw_node(coordinate)
-
-                for node_from, adjacent_nodes in self.graph.adj_list.items():
-                    for node_to in adjacent_nodes:
-                        self.draw_edge(node_from, node_to)
-
-                # End setup        
-                is_setup = False
-                start_time = time.time()
-
-            # Run if still searching and there are still nodes to explore
-            if is_searching and p_queue.empty() == False:
-                distance, current_node = p_queue.get()
-                coordinates = self.graph.get_coordinates(current_node)
-                self.draw_node(coordinates, COLORS["BLUE"])
-
-                # Stop searching if target node is found
-                if current_node == end_node:
-                    is_searching = False #* Stop searching 
-                    self.graph.path = trace_path(self.graph.previous_path, start_node, end_node)
-                    end_time = time.time()
-                    print(f"Total distance: {dist_tracker[end_node]}")
-                    print(f"Total cost: {cost_tracker[end_node]}")
-                    print(f"No. of Edges: {len(self.graph.path) - 1}")
-                    print(f"Explored {len(dist_tracker)} nodes")
-                    print(f"Time elapsed: {round(end_time - start_time, 2)} seconds.")
-
-                # Process adjacent nodes
-                adjacent_nodes = self.graph.get_adj_nodes(current_node)
-                for adj_node in adjacent_nodes:
-                    # Get new distance and cost
-                    new_distance = dist_tracker[current_node] + self.graph.get_distance(current_node, adj_node)
-                    new_cost = cost_tracker[current_node] + self.graph.get_cost(current_node, adj_node)
-
-                    # Check if first time visiting or distance is shorter than previous distance
-                    if adj_node not in dist_tracker or new_distance < dist_tracker[adj_node]:
-                        dist_tracker[adj_node] = new_distance
-                        cost_tracker[adj_node] = new_cost
-
-                        # Draw frontier
-                        frontier = self.graph.get_coordinates(adj_node)
-                        self.draw_node(frontier, COLORS["GREEN"])
-                        p_queue.put((new_distance, adj_node))
-
-                        # Add parent tracer
-                        self.graph.previous_path[adj_node] = current_node
-                
-                #! If no possible paths
-                if is_searching and p_queue.empty():
-                    label_text = font.render("No Possible Path",
-                        False, COLORS["BLACK"], COLORS["WHITE"]
-                    )
-                    label_frame = label_text.get_rect(center=(WIDTH / 2, HEIGHT /2))
-                    # Display label
-                    self.window.blit(label_text, label_frame)
-                    print(f"No path found.")
-                    time.sleep(5)
-                    pygame.quit()
-                    is_searching = False # Stop searching
-                
-                #* Draw valid path
-                if self.graph.path:
-                    node_from = self.graph.path[0]
-                    for node_to in self.graph.path[1:]:
-                        self.draw_node(self.graph.get_coordinates(node_to), COLORS["GREEN"])
-                        self.draw_edge(node_from, node_to, COLORS["GREEN"])
-                        node_from = node_to # Process next in path
-
-                    label_text = font.render(
-                        "Path found, more details in output.",
-                        False, COLORS["BLACK"], COLORS["WHITE"]
-                    )
-                    label_frame = label_text.get_rect(center = (WIDTH / 2, HEIGHT / 2))
-                    self.window.blit(label_text, label_frame)
-
-                    pygame.display.flip() #Update display
-                    time.sleep(5)
-                    pygame.quit()
-
-                    #! Reset
-                    self.graph.path = []
-                    self.graph.previous_path = {}
+        if self.index is None:
+            self.load_index()
+        self.layers = []
+        self.path = None
+        self.message = None
+        self.endpoints = (start_node, end_node)
+        self.set_view(self.query_view() if self.zoom_to_query else self.full_view)
+        self.redraw()
+
+    # Run the shared search engine on a worker thread, which only queues settle / relax
+    # events. This thread drains the queue once per frame at self.fps, so the search runs
+    # at full speed however many nodes it expands and drawing cost is per frame, not per node
+    def animate_search(self, start_node: str, end_node: str, heuristic = None, budget = None):
+        if self.fast_forward:
+            return self.fast_forward_search(start_node, end_node, heuristic, budget)
+        csr = self.graph.csr
+        source, target = csr.index[start_node], csr.index[end_node]
+
+        events = deque()
+        on_settle = lambda node: events.append((SETTLE, node))
+        on_relax = lambda node: events.append((RELAX, node))
+        clock = pygame.time.Clock()
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(search, csr, source, target, heuristic, self.graph.frontier,
+                                     budget=budget, on_settle=on_settle, on_relax=on_relax)
+            while True:
+                # Checked before draining, so the last frame has every event
+                done = future.done()
+                self.draw_events(events)
+                self.handle_events()
+                pygame.display.flip() #Update display
+                if done:
                     break
+                clock.tick(self.fps)
+            result = future.result()
+        end_time = time.time()
+        self.show_result(result, start_node, end_node, end_time - start_time)
+        return result
+
+    # Draw the events queued since the last frame: new frontier nodes, then settled nodes
+    def draw_events(self, events: deque):
+        relaxed = []
+        settled = []
+        for _ in range(len(events)):
+            kind, node = events.popleft()
+            (settled if kind == SETTLE else relaxed).append(node)
+        for nodes, colour in ((relaxed, COLORS["GREEN"]), (settled, COLORS["BLUE"])):
+            if nodes:
+                self.layers.append((nodes, colour))
+                self.draw_nodes(nodes, colour)
+
+    # Search without animation, then draw the final frontier (reached but never settled) in one batch
+    def fast_forward_search(self, start_node: str, end_node: str, heuristic = None, budget = None):
+        csr = self.graph.csr
+        settled = set()
+        start_time = time.time()
+        result = search(csr, csr.index[start_node], csr.index[end_node], heuristic, self.graph.frontier,
+                        budget=budget, on_settle=settled.add)
+        end_time = time.time()
+        self.layers.append(([node for node in result.dist if node not in settled], COLORS["GREEN"]))
+        self.show_result(result, start_node, end_node, end_time - start_time)
+        return result
+
+    # Print the outcome, draw the path and close the window
+    def show_result(self, result, start_node: str, end_node: str, elapsed: float):
+        #! If no possible paths
+        if not result.found():
+            self.message = "No Possible Path"
+            self.redraw()
+            print(f"No path found.")
+            self.wait(RESULT_SECONDS)
+            pygame.quit()
+            return
+
+        self.graph.path = result.path
+        print_path(self.graph.path)
+        print(f"Total distance: {result.distance}")
+        print(f"Total cost: {result.cost}")
+        print(f"No. of Edges: {len(self.graph.path) - 1}")
+        print(f"Explored {result.nodes_explored} nodes")
+        print(f"Settled {result.nodes_settled} nodes, relaxed {result.edges_relaxed} edges, "
+              f"{result.pushes} pushes, {result.stale_pops} stale pops, peak frontier {result.peak_frontier}")
+        print(f"Time elapsed: {round(elapsed, 2)} seconds.")
+
+        #* Draw valid path
+        self.path = self.graph.path
+        self.message = "Path found, more details in output."
+        self.redraw()
+        self.wait(RESULT_SECONDS)
+        pygame.quit()
+
+        #! Reset
+        self.graph.path = []
+        self.graph.previous_path = {}
 
-                pygame.display.flip() #Update display
+    # Relaxed shortest distance with no energy constraint, using Uniform Cost Search
+    def relaxed_shortest_distance(self, start_node, end_node):
+        self.setup(start_node, end_node)
+        return self.animate_search(start_node, end_node)
 
     # Constraint shortest distance with energy budget, using Uniform Cost Search
     def constraint_shortest_distance(self, start_node, end_node, budget):
-        pygame.init()
-
-        font = pygame.font.SysFont("monospace", 15)
-        self.window = pygame.display.set_mode(WINDOW_SIZE)
-        pygame.display.set_caption("Search Path Graph Visualization")
-
-        is_searching = True
-        is_setup = True # To run setup once
-
-        # Setup initialization
-        cost_tracker: dict[str, float] = {start_node: 0.}
-        dist_tracker: dict[str, float] = {start_node: 0.}
-
-        p_queue = PriorityQueue()
-
-        # Enqueue starting node
-        p_queue.put((0, start_node))
-
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-            
-        # Draw start and end vertices
-            start_coord = self.graph.get_coordinates(start_node)
-            self.draw_node(start_coord, COLORS["BLACK"], 3)
-            start_label = font.render(start_node, False, COLORS["BLACK"], COLORS["WHITE"])
-            scaled_coords = scale_coordinate(start_coord)
-    
-            self.window.blit(start_label, scaled_coords)
-
-            end_coord = self.graph.get_coordinates(end_node)
-            self.draw_node(end_coord, COLORS["BLACK"], 3)
-            end_label = font.render(end_node, False, COLORS["BLACK"], COLORS["WHITE"])
-            self.window.blit(end_label, scale_coordinate(end_coord))
-
-            # Run once to render start
-            if is_setup:
-                self.window.fill(COLORS["WHITE"])
-                # Draw every node
-                for _, coordinate in self.graph.coords.items():
-                    self.draw_node(coordinate)
-
-                for node_from, adjacent_nodes in self.graph.adj_list.items():
-                    for node_to in adjacent_nodes:
-                        self.draw_edge(node_from, node_to)
-
-                # End setup        
-                is_setup = False
-                start_time = time.time()
-            
-            # Run if still searching and there are still nodes to explore
-            if is_searching and p_queue.empty() == False:
-                distance, current_node = p_queue.get()
-                coordinates = self.graph.get_coordinates(current_node)
-                self.draw_node(coordinates, COLORS["BLUE"])
-
-                # Stop searching if target node is found
-                if current_node == end_node:
-                    is_searching = False #* Stop searching 
-                    self.graph.path = trace_path(self.graph.previous_path, start_node, end_node)
-                    end_time = time.time()
-                    print(f"Total distance: {dist_tracker[end_node]}")
-                    print(f"Total cost: {cost_tracker[end_node]}")
-                    print(f"No. of Edges: {len(self.graph.path) - 1}")
-                    print(f"Explored {len(dist_tracker)} nodes")
-                    print(f"Time elapsed: {round(end_time - start_time, 2)} seconds.")
-
-                # Process adjacent nodes
-                adjacent_nodes = self.graph.get_adj_nodes(current_node)
-                for adj_node in adjacent_nodes:
-                    # Get new distance and cost
-                    new_distance = dist_tracker[current_node] + self.graph.get_distance(current_node, adj_node)
-                    new_cost = cost_tracker[current_node] + self.graph.get_cost(current_node, adj_node)
-
-                    #! Skip this node if energy exceeds our budget
-                    if new_cost > budget:
-                        continue
-            
-                    # Check if first time visiting or distance is shorter than previous distance
-                    if adj_node not in dist_tracker or new_distance < dist_tracker[adj_node]:
-                        dist_tracker[adj_node] = new_distance
-                        cost_tracker[adj_node] = new_cost
-
-                        # Draw frontier
-                        frontier = self.graph.get_coordinates(adj_node)
-                        self.draw_node(frontier, COLORS["GREEN"])
-                        p_queue.put((new_distance, adj_node))
-
-                        # Add parent tracer
-                        self.graph.previous_path[adj_node] = current_node  
-
-                #! If no possible paths
-                if is_searching and p_queue.empty():
-                    label_text = font.render("No Possible Path",
-                        False, COLORS["BLACK"], COLORS["WHITE"]
-                    )
-                    label_frame = label_text.get_rect(center=(WIDTH / 2, HEIGHT /2))
-                    # Display label
-                    self.window.blit(label_text, label_frame)
-                    print(f"No path found.")
-                    time.sleep(5)
-                    pygame.quit()
-                    is_searching = False # Stop searching
-                
-                #* Draw valid path
-                if self.graph.path:
-                    node_from = self.graph.path[0]
-                    for node_to in self.graph.path[1:]:
-                        self.draw_node(self.graph.get_coordinates(node_to), COLORS["GREEN"])
-                        self.draw_edge(node_from, node_to, COLORS["GREEN"])
-                        node_from = node_to # Process next in path
-
-                    label_text = font.render(
-                        "Path found, more details in output.",
-                        False, COLORS["BLACK"], COLORS["WHITE"]
-                    )
-                    label_frame = label_text.get_rect(center = (WIDTH / 2, HEIGHT / 2))
-                    self.window.blit(label_text, label_frame)
-
-                    pygame.display.flip() #Update display
-                    time.sleep(5)
-                    pygame.quit()
-
-                    #! Reset
-                    self.graph.path = []
-                    self.graph.previous_path = {}
-                    break
+        self.setup(start_node, end_node)
+        return self.animate_search(start_node, end_node, budget=budget)
 
-                pygame.display.flip() #Update display
-
-    # Constraint shortest distance with energy budget, using Uniform Cost Search
+    # Constraint shortest distance with energy budget, using A* Search
     def heuristic_constraint_shortest_distance(self, start_node, end_node, budget, heuristic_multiplier, dist_type):
-        pygame.init()
-
-        font = pygame.font.SysFont("monospace", 15)
-        self.window = pygame.display.set_mode(WINDOW_SIZE)
-        pygame.display.set_caption("Search Path Graph Visualization")
-
-        is_searching = True
-        is_setup = True # To run setup once
-
-        # Setup initialization
-        cost_tracker: dict[str, float] = {start_node: 0.}
-        heuristic_tracker: dict[str, float] = {start_node: 0.}
-        dist_tracker: dict[str, float] = {start_node: 0.}
-
-        p_queue = PriorityQueue()
-
-        # Enqueue starting node
-        #! Note: Additional value in tuple
-        p_queue.put((0, 0, start_node))
-
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-            
-            # Draw start and end vertices
-            start_coord = self.graph.get_coordinates(start_node)
-            self.draw_node(start_coord, COLORS["BLACK"], 3)
-            start_label = font.render(start_node, False, COLORS["BLACK"], COLORS["WHITE"])
-            scaled_coords = scale_coordinate(start_coord)
-    
-            self.window.blit(start_label, scaled_coords)
-
-            end_coord = self.graph.get_coordinates(end_node)
-            self.draw_node(end_coord, COLORS["BLACK"], 3)
-            end_label = font.render(end_node, False, COLORS["BLACK"], COLORS["WHITE"])
-            self.window.blit(end_label, scale_coordinate(end_coord))
-
-            # Run once to render start
-            if is_setup:
-                self.window.fill(COLORS["WHITE"])
-                # Draw every node
-                for _, coordinate in self.graph.coords.items():
-                    self.draw_node(coordinate)
-
-                for node_from, adjacent_nodes in self.graph.adj_list.items():
-                    for node_to in adjacent_nodes:
-                        self.draw_edge(node_from, node_to)
-
-                # End setup        
-                is_setup = False
-                start_time = time.time()
-
-            # Run if still searching and there are still nodes to explore
-            if is_searching and p_queue.empty() == False:
-                herustic_cost, nodes_tracker, current_node = p_queue.get()
-                coordinates = self.graph.get_coordinates(current_node)
-                self.draw_node(coordinates, COLORS["BLUE"])
-
-                # Stop searching if target node is found
-                if current_node == end_node:
-                    is_searching = False #* Stop searching 
-                    self.graph.path = trace_path(self.graph.previous_path, start_node, end_node)
-                    end_time = time.time()
-                    print(f"Total distance: {dist_tracker[end_node]}")
-                    print(f"Total cost: {cost_tracker[end_node]}")
-                    print(f"No. of Edges: {len(self.graph.path) - 1}")
-                    print(f"Explored {len(dist_tracker)} nodes")
-                    print(f"Time elapsed: {round(end_time - start_time, 2)} seconds.")
-                    continue
-
-            # Process adjacent nodes using cost function heuristic
-            adjacent_nodes = self.graph.get_adj_nodes(current_node)
-            for adj_node in adjacent_nodes:
-                # Get new distance and cost
-                new_distance = dist_tracker[current_node] + self.graph.get_distance(current_node, adj_node)
-                new_cost = cost_tracker[current_node] + self.graph.get_cost(current_node, adj_node)
-
-                #! Heuristic
-                #* Euclidean distance (Bird's Eye / Pythagorean theorem)
-                if dist_type == "euclidean":
-                    herustic_cost = self.graph.get_euclidean_distance(adj_node, end_node)
-
-                #* Manhattan distance (Grid Distance / x_coord distance + y_coord distance)
-                elif dist_type == "manhattan":
-                    herustic_cost = self.graph.get_manhattan_distance(adj_node, end_node)
-
-                a_star_cost = new_distance + (herustic_cost * heuristic_multiplier)
-
-                #! Skip this node if energy exceeds our budget
-                if new_cost > budget:
-                    continue
-        
-                # Check if first time visiting or adjusted distance is shorter than previous
-                if adj_node not in heuristic_tracker or a_star_cost < heuristic_tracker[adj_node]:
-                    dist_tracker[adj_node] = new_distance
-                    cost_tracker[adj_node] = new_cost
-                    heuristic_tracker[adj_node] = a_star_cost
-
-                    # Draw frontier
-                    frontier = self.graph.get_coordinates(adj_node)
-                    self.draw_node(frontier, COLORS["GREEN"])
-                    p_queue.put((a_star_cost, nodes_tracker, adj_node))
-
-                    # Add parent tracer
-                    self.graph.previous_path[adj_node] = current_node
-
-            #! If no possible paths
-            if is_searching and p_queue.empty():
-                label_text = font.render("No Possible Path",
-                    False, COLORS["BLACK"], COLORS["WHITE"]
-                )
-                label_frame = label_text.get_rect(center=(WIDTH / 2, HEIGHT /2))
-                # Display label
-                self.window.blit(label_text, label_frame)
-                print(f"No path found.")
-
-                time.sleep(5)
-                pygame.quit()
-                is_searching = False # Stop searching
-            
-            #* Draw valid path
-            if self.graph.path:
-                node_from = self.graph.path[0]
-                for node_to in self.graph.path[1:]:
-                    self.draw_node(self.graph.get_coordinates(node_to), COLORS["GREEN"])
-                    self.draw_edge(node_from, node_to, COLORS["GREEN"])
-                    node_from = node_to # Process next in path
-
-                label_text = font.render(
-                    "Path found, more details in output.",
-                    False, COLORS["BLACK"], COLORS["WHITE"]
-                )
-                label_frame = label_text.get_rect(center = (WIDTH / 2, HEIGHT / 2))
-                self.window.blit(label_text, label_frame)
-
-                pygame.display.flip() #Update display
-                time.sleep(5)
-                pygame.quit()
-
-                #! Reset
-                self.graph.path = []
-                self.graph.previous_path = {}
-                break
-
-            pygame.display.flip() #Update display
\ No newline at end of file
+        self.setup(start_node, end_node)
+        csr = self.graph.csr
+        heuristic = self.graph.heuristic(csr.index[start_node], csr.index[end_node], dist_type, heuristic_multiplier)
+        return self.animate_search(start_node, end_node, heuristic, budget)
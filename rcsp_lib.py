@@ -0,0 +1,109 @@
+# Imports
+import heapq
+from math import inf
+
+from csr_lib import CSRGraph
+from search_lib import SearchResult, reverse_distances
+
+# Exact resource constrained shortest path (shortest distance within an energy budget)
+# Label-setting search: a node can hold several (distance, energy) labels, one per
+# Pareto-optimal way of reaching it, instead of the single best-distance label
+# the greedy budget search keeps.
+#
+# Labels pop in order of distance + heuristic, so labels settled at a node have
+# non-decreasing distance and a new label there is only worth keeping if its energy
+# is below every settled one. That makes the dominance check a single lookup.
+#
+# Two reverse Dijkstra trees from the target give the pruning bounds:
+#   energy: labels that cannot reach the target within the budget are dropped
+#   distance: exact lower bound used as the A* heuristic, unless one is passed in
+# The minimum energy path is also the first feasible upper bound on distance.
+# A custom heuristic must be consistent (e.g. coordinate heuristic, multiplier <= 1).
+#
+# Energy sums depend on the order they are added in (the reverse bounds add from the
+# target, path totals from the source), so budgets are compared with a relative
+# tolerance: a budget equal to a path's reported cost always admits that path.
+BUDGET_TOLERANCE = 1e-9
+
+
+# Largest energy still within budget, allowing for rounding in the sums
+def budget_limit(budget: float) -> float:
+    return budget + BUDGET_TOLERANCE * max(1., abs(budget))
+
+
+def constrained_search(csr: CSRGraph, source: int, target: int, budget: float, heuristic = None) -> SearchResult:
+    offsets, targets, dists, costs = csr.offsets, csr.targets, csr.dists, csr.costs
+    limit = budget_limit(budget)
+
+    #! No path within budget if even the minimum energy path is too expensive
+    cost_bound, cost_next = reverse_distances(csr, target, "costs")
+    if source not in cost_bound or cost_bound[source] > limit:
+        return SearchResult(csr, source, target, {}, {}, 0)
+
+    if heuristic is None:
+        dist_bound, _ = reverse_distances(csr, target, "dists")
+        heuristic = dist_bound.__getitem__
+    elif not callable(heuristic):
+        heuristic = heuristic.__getitem__
+
+    # Upper bound from the minimum energy path
+    best_path = [source]
+    while best_path[-1] != target:
+        best_path.append(cost_next[best_path[-1]])
+    best_distance, _ = csr.path_totals(best_path)
+
+    # Labels as parallel lists, indexed by label id
+    label_node = [source]
+    label_dist = [0.]
+    label_parent = [-1]
+    min_settled_cost: dict[int, float] = {}
+    heap = [(heuristic(source), 0., 0)]
+    labels_settled = 0
+
+    while heap:
+        priority, current_cost, label = heapq.heappop(heap)
+        # Nothing left in the queue can beat the best path found
+        if priority >= best_distance:
+            break
+
+        current_node = label_node[label]
+        # Dominated by a settled label with less distance and less energy
+        if current_cost >= min_settled_cost.get(current_node, inf):
+            continue
+        min_settled_cost[current_node] = current_cost
+        labels_settled += 1
+
+        # First target label popped is optimal
+        if current_node == target:
+            best_distance = label_dist[label]
+            best_path = []
+            while label >= 0:
+                best_path.append(label_node[label])
+                label = label_parent[label]
+            best_path.reverse()
+            break
+
+        current_distance = label_dist[label]
+        for e in range(offsets[current_node], offsets[current_node + 1]):
+            adj_node = targets[e]
+            new_cost = current_cost + costs[e]
+
+            #! Skip labels that cannot reach the target within budget
+            if new_cost + cost_bound.get(adj_node, inf) > limit:
+                continue
+            if new_cost >= min_settled_cost.get(adj_node, inf):
+                continue
+
+            new_distance = current_distance + dists[e]
+            new_priority = new_distance + heuristic(adj_node)
+            if new_priority >= best_distance:
+                continue
+
+            label_node.append(adj_node)
+            label_dist.append(new_distance)
+            label_parent.append(label)
+            heapq.heappush(heap, (new_priority, new_cost, len(label_node) - 1))
+
+    result = SearchResult(csr, source, target, {}, {}, labels_settled, best_path)
+    result.nodes_explored = len(label_node)
+    return result
@@ -0,0 +1,517 @@
+# Imports
+import heapq
+from array import array
+from functools import partial
+from math import inf
+from time import perf_counter
+
+from csr_lib import CSRGraph, trace_index_path
+
+# Frontiers
+# Every frontier takes (priority, node) items through push() and returns the
+# smallest with pop(). The engine drops stale entries when they are popped, so a
+# frontier is free to keep duplicates (lazy deletion) as long as it never loses an item.
+
+
+# Binary heap with lazy deletion, push/pop are bound straight to heapq
+class HeapFrontier:
+    def __init__(self):
+        self.heap = []
+        self.push = partial(heapq.heappush, self.heap)
+        self.pop = partial(heapq.heappop, self.heap)
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+
+# Binary heap with a position index, pushing a queued node decreases its key
+# instead of adding a duplicate, so no stale entries are ever popped
+class IndexedHeapFrontier:
+    def __init__(self):
+        self.heap: list[tuple[float, int]] = []
+        self.position: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, item: 'tuple[float, int]'):
+        priority, node = item
+        i = self.position.get(node)
+        if i is None:
+            self.heap.append(item)
+            i = len(self.heap) - 1
+        elif priority < self.heap[i][0]:
+            self.heap[i] = item
+        else:
+            return
+        self._sift_up(i)
+
+    def pop(self) -> 'tuple[float, int]':
+        heap, position = self.heap, self.position
+        top = heap[0]
+        last = heap.pop()
+        del position[top[1]]
+        if heap:
+            heap[0] = last
+            position[last[1]] = 0
+            self._sift_down(0)
+        return top
+
+    def _sift_up(self, i: int):
+        heap, position = self.heap, self.position
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent] <= item:
+                break
+            heap[i] = heap[parent]
+            position[heap[i][1]] = i
+            i = parent
+        heap[i] = item
+        position[item[1]] = i
+
+    def _sift_down(self, i: int):
+        heap, position = self.heap, self.position
+        size = len(heap)
+        item = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if item <= heap[child]:
+                break
+            heap[i] = heap[child]
+            position[heap[i][1]] = i
+            i = child
+        heap[i] = item
+        position[item[1]] = i
+
+
+# Radix heap over integer-scaled priorities (priority * scale, truncated)
+# Needs monotone priorities (Dijkstra, consistent A*). Ties within 1 / scale pop
+# in arbitrary order, so distances can be off by at most path_edges / scale.
+class RadixFrontier:
+    def __init__(self, scale: float = 1000.):
+        self.scale = scale
+        self.last = 0
+        self.buckets: list[list] = [[] for _ in range(65)]
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def push(self, item: 'tuple[float, int]'):
+        priority, node = item
+        key = int(priority * self.scale)
+        # Inadmissible heuristics can undershoot the last popped key, clamp to stay monotone
+        if key < self.last:
+            key = self.last
+        bucket = (key ^ self.last).bit_length()
+        while bucket >= len(self.buckets):
+            self.buckets.append([])
+        self.buckets[bucket].append((key, priority, node))
+        self.size += 1
+
+    def pop(self) -> 'tuple[float, int]':
+        buckets = self.buckets
+        if not buckets[0]:
+            # Move the smallest non-empty bucket down around its minimum key
+            i = 1
+            while not buckets[i]:
+                i += 1
+            entries = buckets[i]
+            buckets[i] = []
+            last = self.last = min(entries)[0]
+            for entry in entries:
+                buckets[(entry[0] ^ last).bit_length()].append(entry)
+        self.size -= 1
+        _, priority, node = buckets[0].pop()
+        return (priority, node)
+
+
+FRONTIERS = {
+    "heap": HeapFrontier,
+    "indexed": IndexedHeapFrontier,
+    "radix": RadixFrontier,
+}
+
+
+# Accept a frontier name, class or ready made instance
+def make_frontier(frontier = "heap"):
+    if isinstance(frontier, str):
+        return FRONTIERS[frontier]()
+    if isinstance(frontier, type):
+        return frontier()
+    return frontier
+
+
+# Heuristics over the CSR coordinates, returned as node -> estimate callables
+def coordinate_heuristic(csr: CSRGraph, target: int, dist_type: str, multiplier: float = 1.):
+    if not multiplier:
+        return None
+    xs, ys = csr.xs, csr.ys
+    target_x, target_y = xs[target], ys[target]
+
+    #* Euclidean distance (Bird's Eye / Pythagorean theorem)
+    if dist_type == "euclidean":
+        return lambda node: (((xs[node] - target_x) ** 2 + (ys[node] - target_y) ** 2) ** 0.5) * multiplier
+
+    #* Manhattan distance (Grid Distance / x_coord distance + y_coord distance)
+    if dist_type == "manhattan":
+        return lambda node: (abs(xs[node] - target_x) + abs(ys[node] - target_y)) * multiplier
+
+    raise ValueError(f"Unknown distance heuristic {dist_type}")
+
+
+# The same heuristics precomputed for every node in one vectorised numpy pass
+# Returns an array('d') indexed by node, so the search loop only does an index lookup
+# Falls back to coordinate_heuristic when numpy is not installed
+def heuristic_table(csr: CSRGraph, target: int, dist_type: str, multiplier: float = 1.):
+    if not multiplier:
+        return None
+    try:
+        import numpy as np
+    except ImportError:
+        return coordinate_heuristic(csr, target, dist_type, multiplier)
+
+    # Zero-copy views over the coordinate arrays (array('d') or snapshot memoryviews)
+    xs = np.frombuffer(csr.xs, dtype=np.float64)
+    ys = np.frombuffer(csr.ys, dtype=np.float64)
+    dx = np.abs(xs - xs[target])
+    dy = np.abs(ys - ys[target])
+    if dist_type == "euclidean":
+        values = np.sqrt(dx * dx + dy * dy)
+    elif dist_type == "manhattan":
+        values = dx + dy
+    else:
+        raise ValueError(f"Unknown distance heuristic {dist_type}")
+    values *= multiplier
+    return array('d', values.tobytes())
+
+
+# Outcome of a single search
+# index_path can be passed in when the path is not a single parent chain (bidirectional)
+# Counters and per-phase timings (perf_counter seconds) are filled in by search(),
+# engines that do not track one leave it at 0
+class SearchResult:
+    def __init__(self, csr: CSRGraph, source: int, target, dist: dict, parent: dict, nodes_settled: int, index_path = None):
+        self.csr = csr
+        self.source = source
+        self.target = target
+        self.dist = dist
+        self.parent = parent
+        self.nodes_explored = len(dist)
+        self.nodes_settled = nodes_settled
+        self.edges_relaxed = 0
+        self.pushes = 0
+        self.stale_pops = 0
+        self.peak_frontier = 0
+        self.timings: dict[str, float] = {}
+        # Bytes allocated at peak during the query, set by Graph.route(measure_memory=True)
+        self.peak_memory = None
+
+        self.index_path = None
+        self.path = None
+        self.distance = None
+        self.cost = None
+        if index_path is None and target is not None and target in dist:
+            index_path = trace_index_path(parent, source, target)
+        if index_path is not None:
+            self.index_path = index_path
+            self.path = csr.to_ids(index_path)
+            self.distance, self.cost = csr.path_totals(index_path)
+
+    def found(self) -> bool:
+        return self.index_path is not None
+
+    # Counters and timings as a flat dict, for logs and metrics
+    def stats(self) -> dict:
+        stats = {
+            "found": self.found(),
+            "distance": self.distance,
+            "cost": self.cost,
+            "edges": len(self.index_path) - 1 if self.found() else None,
+            "nodes_explored": self.nodes_explored,
+            "nodes_settled": self.nodes_settled,
+            "edges_relaxed": self.edges_relaxed,
+            "pushes": self.pushes,
+            "stale_pops": self.stale_pops,
+            "peak_frontier": self.peak_frontier,
+            "peak_memory": self.peak_memory,
+        }
+        for phase, seconds in self.timings.items():
+            stats[f"{phase}_seconds"] = seconds
+        return stats
+
+
+# Shortest path search shared by every UCS / A* routine
+# heuristic: None (UCS), a node -> estimate callable, or a sequence indexed by node
+# budget: skip edges that push the accumulated energy cost over the budget
+# blocked_nodes / blocked_edges: index sets (and (u, v) pairs) the search must not use
+# on_settle / on_relax: optional callbacks, used by the visualiser
+# trace: optional trace(event, node, value) hook for "settle" (distance), "relax" (new distance)
+# and "stale" (priority) events. It rides on the same branches as the callbacks, so the
+# loop does no extra work per edge when it is off
+# weights / cost_multiplier: edge weight is weights[e] + cost_multiplier * costs[e]
+# ("dists" by default, "costs" for minimum energy, a multiplier for Lagrangian weights)
+# target None settles every reachable node
+def search(csr: CSRGraph, source: int, target = None, heuristic = None, frontier = "heap", budget = None,
+           blocked_nodes = None, blocked_edges = None, on_settle = None, on_relax = None,
+           weights: str = "dists", cost_multiplier: float = 0., trace = None) -> SearchResult:
+    setup_start = perf_counter()
+    offsets, targets, dists = csr.offsets, csr.targets, getattr(csr, weights)
+    costs = csr.costs if budget is not None or cost_multiplier else None
+    if heuristic is not None and not callable(heuristic):
+        heuristic = heuristic.__getitem__
+    blocked_nodes = blocked_nodes or ()
+    blocked_edges = blocked_edges or None
+
+    frontier = make_frontier(frontier)
+    push, pop = frontier.push, frontier.pop
+    dist: dict[int, float] = {source: 0.}
+    cost: dict[int, float] = {source: 0.}
+    parent: dict[int, int] = {}
+    # Priority each node was last queued with, older duplicates are stale
+    # With a consistent heuristic this acts as a closed set; an inflated heuristic
+    # can still reopen a node when a strictly shorter distance to it turns up
+    queued: dict[int, float] = {}
+    nodes_settled = 0
+    edges_relaxed = 0
+    pushes = 1
+    stale_pops = 0
+    peak_frontier = 0
+
+    on_stale = None
+    if trace:
+        on_settle = chain_callbacks(on_settle, lambda node: trace("settle", node, dist[node]))
+        on_relax = chain_callbacks(on_relax, lambda node: trace("relax", node, dist[node]))
+        on_stale = lambda node: trace("stale", node, queued[node])
+
+    priority = heuristic(source) if heuristic else 0.
+    queued[source] = priority
+    push((priority, source))
+    search_start = perf_counter()
+    while True:
+        size = len(frontier)
+        if not size:
+            break
+        if size > peak_frontier:
+            peak_frontier = size
+        priority, current_node = pop()
+        # Skip stale duplicates left behind by lazy deletion
+        if priority > queued[current_node]:
+            stale_pops += 1
+            if on_stale:
+                on_stale(current_node)
+            continue
+        nodes_settled += 1
+        if on_settle:
+            on_settle(current_node)
+
+        # Stop searching if target node is found
+        if current_node == target:
+            break
+
+        current_distance = dist[current_node]
+        first_edge, last_edge = offsets[current_node], offsets[current_node + 1]
+        edges_relaxed += last_edge - first_edge
+        for e in range(first_edge, last_edge):
+            adj_node = targets[e]
+            if adj_node in blocked_nodes:
+                continue
+            if blocked_edges and (current_node, adj_node) in blocked_edges:
+                continue
+
+            #! Skip this edge if energy exceeds our budget
+            if budget is not None:
+                new_cost = cost[current_node] + costs[e]
+                if new_cost > budget:
+                    continue
+
+            # Check if first time visiting or distance is shorter than previous distance
+            if cost_multiplier:
+                new_distance = current_distance + dists[e] + cost_multiplier * costs[e]
+            else:
+                new_distance = current_distance + dists[e]
+            if adj_node not in dist or new_distance < dist[adj_node]:
+                dist[adj_node] = new_distance
+                parent[adj_node] = current_node
+                if budget is not None:
+                    cost[adj_node] = new_cost
+                priority = new_distance + heuristic(adj_node) if heuristic else new_distance
+                queued[adj_node] = priority
+                push((priority, adj_node))
+                pushes += 1
+                if on_relax:
+                    on_relax(adj_node)
+
+    path_start = perf_counter()
+    result = SearchResult(csr, source, target, dist, parent, nodes_settled)
+    result.edges_relaxed = edges_relaxed
+    result.pushes = pushes
+    result.stale_pops = stale_pops
+    result.peak_frontier = peak_frontier
+    result.timings = {
+        "setup": search_start - setup_start,
+        "search": path_start - search_start,
+        "path": perf_counter() - path_start,
+    }
+    return result
+
+
+# Call first then second, either can be None
+def chain_callbacks(first, second):
+    if first is None:
+        return second
+
+    def both(node: int):
+        first(node)
+        second(node)
+    return both
+
+
+# Bidirectional Dijkstra / A*
+# Searches forward from source over the CSR and backward from target over its
+# reverse, always expanding the side with the smaller queue.
+# With heuristic_forward h(v, target) and heuristic_backward h(source, v) the
+# searches use the average potential p(v) = (h_forward(v) - h_backward(v)) / 2,
+# keyed d_f(v) + p(v) forward and d_b(v) - p(v) backward. p stays consistent when
+# both heuristics are, so it is safe to stop once the two queue tops add up to
+# the best source -> target distance seen so far.
+# trace gets the same events as in search, with distances from source for forward
+# nodes and distances to target for backward ones
+def bidirectional_search(csr: CSRGraph, source: int, target: int, heuristic_forward = None, heuristic_backward = None,
+                         trace = None) -> SearchResult:
+    setup_start = perf_counter()
+    if source == target:
+        if trace:
+            trace("settle", source, 0.)
+        return SearchResult(csr, source, target, {source: 0.}, {}, 1, [source])
+
+    reverse = csr.reverse()
+    dists = csr.dists
+    if heuristic_forward is not None:
+        h_forward = heuristic_forward if callable(heuristic_forward) else heuristic_forward.__getitem__
+        h_backward = heuristic_backward if callable(heuristic_backward) else heuristic_backward.__getitem__
+        potential = lambda node: (h_forward(node) - h_backward(node)) * 0.5
+    else:
+        potential = None
+
+    # Per side: adjacency, edge id map, sign of the potential
+    sides = (
+        (csr.offsets, csr.targets, None, 1.),
+        (reverse.offsets, reverse.targets, reverse.edge_ids, -1.),
+    )
+    dist = ({source: 0.}, {target: 0.})
+    parent = ({}, {})
+    queued = ({}, {})
+    heaps = ([], [])
+    for side, node in ((0, source), (1, target)):
+        priority = sides[side][3] * potential(node) if potential else 0.
+        queued[side][node] = priority
+        heaps[side].append((priority, node))
+
+    best_distance, meeting_node = inf, None
+    nodes_settled = 0
+    edges_relaxed = 0
+    pushes = 2
+    stale_pops = 0
+    peak_frontier = 0
+    search_start = perf_counter()
+    while True:
+        # Drop stale tops so the stopping rule compares real queue minimums
+        for side in (0, 1):
+            heap = heaps[side]
+            while heap and heap[0][0] > queued[side][heap[0][1]]:
+                _, node = heapq.heappop(heap)
+                stale_pops += 1
+                if trace:
+                    trace("stale", node, queued[side][node])
+        size = len(heaps[0]) + len(heaps[1])
+        if size > peak_frontier:
+            peak_frontier = size
+        if not heaps[0] or not heaps[1]:
+            break
+        if heaps[0][0][0] + heaps[1][0][0] >= best_distance:
+            break
+
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        offsets, targets, edge_ids, sign = sides[side]
+        side_dist, side_parent, side_queued, heap = dist[side], parent[side], queued[side], heaps[side]
+        other_dist = dist[1 - side]
+
+        _, current_node = heapq.heappop(heap)
+        nodes_settled += 1
+        current_distance = side_dist[current_node]
+        if trace:
+            trace("settle", current_node, current_distance)
+        first_edge, last_edge = offsets[current_node], offsets[current_node + 1]
+        edges_relaxed += last_edge - first_edge
+        for e in range(first_edge, last_edge):
+            adj_node = targets[e]
+            new_distance = current_distance + dists[e if edge_ids is None else edge_ids[e]]
+            if adj_node not in side_dist or new_distance < side_dist[adj_node]:
+                side_dist[adj_node] = new_distance
+                side_parent[adj_node] = current_node
+                priority = new_distance + sign * potential(adj_node) if potential else new_distance
+                side_queued[adj_node] = priority
+                heapq.heappush(heap, (priority, adj_node))
+                pushes += 1
+                if trace:
+                    trace("relax", adj_node, new_distance)
+
+            # Both searches reached adj_node, check the joined path
+            if adj_node in other_dist:
+                total = side_dist[adj_node] + other_dist[adj_node]
+                if total < best_distance:
+                    best_distance, meeting_node = total, adj_node
+
+    path_start = perf_counter()
+    index_path = None
+    if meeting_node is not None:
+        index_path = trace_index_path(parent[0], source, meeting_node)
+        node = meeting_node
+        while node != target:
+            node = parent[1][node]
+            index_path.append(node)
+
+    merged = dict(dist[1])
+    merged.update(dist[0])
+    result = SearchResult(csr, source, target, merged, parent[0], nodes_settled, index_path)
+    result.edges_relaxed = edges_relaxed
+    result.pushes = pushes
+    result.stale_pops = stale_pops
+    result.peak_frontier = peak_frontier
+    result.timings = {
+        "setup": search_start - setup_start,
+        "search": path_start - search_start,
+        "path": perf_counter() - path_start,
+    }
+    return result
+
+
+# Distances from every node to target, by a full Dijkstra over the reverse graph
+# weights names the edge array to sum: "dists" or "costs"
+# Returns (distance, next_node) dicts, following next_node from v walks the optimal path to target
+def reverse_distances(csr: CSRGraph, target: int, weights: str = "dists"):
+    reverse = csr.reverse()
+    offsets, sources, edge_ids = reverse.offsets, reverse.targets, reverse.edge_ids
+    values = getattr(csr, weights)
+
+    dist: dict[int, float] = {target: 0.}
+    next_node: dict[int, int] = {}
+    heap = [(0., target)]
+    while heap:
+        current_distance, current_node = heapq.heappop(heap)
+        if current_distance > dist[current_node]:
+            continue
+        for e in range(offsets[current_node], offsets[current_node + 1]):
+            adj_node = sources[e]
+            new_distance = current_distance + values[edge_ids[e]]
+            if adj_node not in dist or new_distance < dist[adj_node]:
+                dist[adj_node] = new_distance
+                next_node[adj_node] = current_node
+                heapq.heappush(heap, (new_distance, adj_node))
+    return dist, next_node
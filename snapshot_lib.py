@@ -0,0 +1,194 @@
+# Imports
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import time
+
+from csr_lib import CSRGraph, LazyCSRGraph
+from ingest_lib import build_csr_streaming
+
+# Binary graph snapshot
+# Layout: fixed header, then 8 byte aligned sections in this order
+#   offsets (int32, n + 1), targets (int32, m), dists (float64, m),
+#   costs (float64, m), xs (float64, n), ys (float64, n), node ids (utf-8, '\n' separated)
+# The checksum is the sha256 of everything after the header. The header also records
+# the size of each JSON source file it was compiled from (0 when unknown), so a snapshot
+# is only used for the data directory it came from.
+SNAPSHOT_MAGIC = b"CZGRAPH\0"
+SNAPSHOT_VERSION = 2
+HEADER_FORMAT = "<8sIIQQQ32s4Q"
+HEADER_SIZE = 104
+SNAPSHOT_NAME = "graph.snap"
+DEFAULT_SNAPSHOT = os.path.join("data", SNAPSHOT_NAME)
+JSON_FILES = ("G.json", "Coord.json", "Dist.json", "Cost.json")
+
+
+# Snapshot file for a data directory
+def snapshot_path(data_dir: str = "data") -> str:
+    return os.path.join(data_dir, SNAPSHOT_NAME)
+
+
+# Size of each JSON source file in data_dir, 0 for files that do not exist
+def source_sizes(data_dir: str = None) -> 'tuple[int, ...]':
+    sizes = []
+    for json_file in JSON_FILES:
+        path = os.path.join(data_dir, json_file) if data_dir else None
+        sizes.append(os.path.getsize(path) if path and os.path.exists(path) else 0)
+    return tuple(sizes)
+
+
+# Header fields of a snapshot file as a tuple in HEADER_FORMAT order
+def read_header(file_name: str) -> tuple:
+    with open(file_name, 'rb') as file:
+        header = file.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError(f"{file_name} is not a graph snapshot")
+    return struct.unpack_from(HEADER_FORMAT, header, 0)
+
+
+# Round up to the next multiple of 8 bytes
+def align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+# Return list of (name, typecode, count) in file order
+def section_layout(num_nodes: int, num_edges: int) -> 'list[tuple[str, str, int]]':
+    return [
+        ("offsets", 'i', num_nodes + 1),
+        ("targets", 'i', num_edges),
+        ("dists", 'd', num_edges),
+        ("costs", 'd', num_edges),
+        ("xs", 'd', num_nodes),
+        ("ys", 'd', num_nodes),
+    ]
+
+
+ITEM_SIZES = {'i': 4, 'd': 8}
+
+
+# Write a CSR graph to a snapshot file, data_dir: where its JSON source files are
+def write_snapshot(csr: CSRGraph, file_name: str = DEFAULT_SNAPSHOT, data_dir: str = None) -> str:
+    ids_blob = "\n".join(csr.node_ids).encode("utf-8")
+    sha = hashlib.sha256()
+    tmp_name = f"{file_name}.tmp"
+
+    with open(tmp_name, 'wb') as file:
+        file.write(bytes(HEADER_SIZE))
+        for name, typecode, count in section_layout(csr.num_nodes(), csr.num_edges()):
+            data = memoryview(getattr(csr, name)).cast('B')
+            assert len(data) == count * ITEM_SIZES[typecode]
+            padding = bytes(align(len(data)) - len(data))
+            for chunk in (data, padding):
+                file.write(chunk)
+                sha.update(chunk)
+        file.write(ids_blob)
+        sha.update(ids_blob)
+
+        checksum = sha.digest()
+        file.seek(0)
+        file.write(struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0,
+                               csr.num_nodes(), csr.num_edges(), len(ids_blob), checksum, *source_sizes(data_dir)))
+
+    # Replace atomically so readers never see a half written snapshot
+    os.replace(tmp_name, file_name)
+    return checksum.hex()
+
+
+# Memory-mapped CSR graph, the arrays are views straight into the page cache
+# Opening only reads the header, each component is mapped on first access
+class SnapshotGraph(LazyCSRGraph):
+    def __init__(self, file_name: str = DEFAULT_SNAPSHOT, verify: bool = False):
+        super().__init__()
+        self.file_name = file_name
+        with open(file_name, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = struct.unpack_from("<8sI", self.mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{file_name} is not a graph snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{file_name} has snapshot version {version}, expected {SNAPSHOT_VERSION}")
+        _, _, _, num_nodes, num_edges, ids_size, checksum, *sources = struct.unpack_from(HEADER_FORMAT, self.mmap, 0)
+        self.sources = tuple(sources)
+        self.checksum = checksum.hex()
+
+        buffer = memoryview(self.mmap)
+        position = HEADER_SIZE
+        self.sections = {}
+        for name, typecode, count in section_layout(num_nodes, num_edges):
+            size = count * ITEM_SIZES[typecode]
+            self.sections[name] = buffer[position:position + size].cast(typecode)
+            position += align(size)
+        self.ids_blob = buffer[position:position + ids_size]
+        self.num_ids = num_nodes
+
+        if verify and hashlib.sha256(buffer[HEADER_SIZE:position + ids_size]).digest() != checksum:
+            raise ValueError(f"{file_name} failed checksum verification")
+
+    def _load_adjacency(self):
+        node_ids = str(self.ids_blob, "utf-8").split("\n") if self.num_ids else []
+        index = {node: i for i, node in enumerate(node_ids)}
+        return node_ids, index, self.sections["offsets"], self.sections["targets"]
+
+    def _load_dists(self):
+        return self.sections["dists"]
+
+    def _load_costs(self):
+        return self.sections["costs"]
+
+    def _load_coords(self):
+        return self.sections["xs"], self.sections["ys"]
+
+
+# Return True if the snapshot exists, has the current version, and every JSON source file
+# present in data_dir is older than it and the size recorded when it was compiled
+def snapshot_is_fresh(file_name: str = DEFAULT_SNAPSHOT, data_dir: str = "data") -> bool:
+    if not os.path.exists(file_name):
+        return False
+    try:
+        magic, version, *fields = read_header(file_name)
+    except (OSError, ValueError, struct.error):
+        return False
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return False
+    recorded = fields[-len(JSON_FILES):]
+    snapshot_time = os.path.getmtime(file_name)
+    for json_file, recorded_size in zip(JSON_FILES, recorded):
+        path = os.path.join(data_dir, json_file)
+        if not os.path.exists(path):
+            continue
+        if os.path.getmtime(path) > snapshot_time or os.path.getsize(path) != recorded_size:
+            return False
+    return True
+
+
+# Compile the four JSON data files into a snapshot
+def compile_snapshot(data_dir: str = "data", file_name: str = None) -> str:
+    file_name = file_name or snapshot_path(data_dir)
+    start_time = time.time()
+    print(f"Loading JSON data from {data_dir}")
+    csr = build_csr_streaming(data_dir)
+
+    checksum = write_snapshot(csr, file_name, data_dir)
+    print(f"Wrote {file_name}: {csr.num_nodes()} nodes, {csr.num_edges()} edges, sha256 {checksum}")
+    print(f"Time elapsed: {round(time.time() - start_time, 2)} seconds.")
+    return checksum
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile G/Coord/Dist/Cost JSON files into a binary graph snapshot")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--output", help="default: graph.snap in the data directory")
+    parser.add_argument("--verify", action="store_true", help="re-open the snapshot and check its checksum")
+    args = parser.parse_args()
+
+    output = args.output or snapshot_path(args.data_dir)
+    compile_snapshot(args.data_dir, output)
+    if args.verify:
+        SnapshotGraph(output, verify=True)
+        print(f"Checksum verified")
+
+if __name__ == "__main__":
+    main()
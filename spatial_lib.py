@@ -0,0 +1,162 @@
+# Imports
+import heapq
+from array import array
+from math import sqrt
+
+# Spatial indexes over node coordinates
+# GridIndex buckets nodes into a uniform grid of square-ish cells with a counting sort:
+# order holds node indices grouped by cell, row by row, and cell_offsets[c] is where
+# cell c starts. The cells of one grid row are contiguous in order, so a box query
+# is one slice per row it spans. Results are whole cells, so callers clip to the box
+# themselves when it matters (pygame drawing clips anyway).
+CELL_NODES = 16
+
+
+class GridIndex:
+    def __init__(self, xs, ys, cell_nodes: int = CELL_NODES):
+        num_nodes = len(xs)
+        self.min_x, self.max_x = min(xs), max(xs)
+        self.min_y, self.max_y = min(ys), max(ys)
+        width = (self.max_x - self.min_x) or 1.
+        height = (self.max_y - self.min_y) or 1.
+        # Square cells holding cell_nodes nodes on average
+        cell_size = sqrt(width * height * cell_nodes / max(num_nodes, 1))
+        self.cols = max(1, min(num_nodes, int(width / cell_size) + 1))
+        self.rows = max(1, min(num_nodes, int(height / cell_size) + 1))
+        self.cell_width = width / self.cols
+        self.cell_height = height / self.rows
+
+        cells = array('i', (self.cell(x, y) for x, y in zip(xs, ys)))
+        counts = array('i', bytes(4 * (self.cols * self.rows + 1)))
+        for cell in cells:
+            counts[cell + 1] += 1
+        for cell in range(self.cols * self.rows):
+            counts[cell + 1] += counts[cell]
+        self.cell_offsets = counts
+        self.order = array('i', bytes(4 * num_nodes))
+        position = array('i', counts)
+        for node, cell in enumerate(cells):
+            self.order[position[cell]] = node
+            position[cell] += 1
+
+    def bounds(self) -> 'tuple[float, float, float, float]':
+        return (self.min_x, self.max_x, self.min_y, self.max_y)
+
+    def column(self, x: float) -> int:
+        return min(self.cols - 1, max(0, int((x - self.min_x) / self.cell_width)))
+
+    def row(self, y: float) -> int:
+        return min(self.rows - 1, max(0, int((y - self.min_y) / self.cell_height)))
+
+    def cell(self, x: float, y: float) -> int:
+        return self.row(y) * self.cols + self.column(x)
+
+    # Node indices in every cell overlapping the box, as one array('i')
+    def query(self, min_x: float, max_x: float, min_y: float, max_y: float):
+        nodes = array('i')
+        if max_x < self.min_x or min_x > self.max_x or max_y < self.min_y or min_y > self.max_y:
+            return nodes
+        first_col, last_col = self.column(min_x), self.column(max_x)
+        offsets = self.cell_offsets
+        for row in range(self.row(min_y), self.row(max_y) + 1):
+            first_cell = row * self.cols
+            nodes.extend(self.order[offsets[first_cell + first_col]:offsets[first_cell + last_col + 1]])
+        return nodes
+
+
+# Largest x and y extent of any edge, the margin a box query needs so that edges
+# crossing the box from a node outside it are found from their source node
+def edge_span(csr) -> 'tuple[float, float]':
+    xs, ys, offsets, targets = csr.xs, csr.ys, csr.offsets, csr.targets
+    try:
+        import numpy as np
+    except ImportError:
+        span_x = span_y = 0.
+        for node in range(csr.num_nodes()):
+            x, y = xs[node], ys[node]
+            for edge in range(offsets[node], offsets[node + 1]):
+                span_x = max(span_x, abs(xs[targets[edge]] - x))
+                span_y = max(span_y, abs(ys[targets[edge]] - y))
+        return (span_x, span_y)
+
+    if not len(targets):
+        return (0., 0.)
+    xs = np.frombuffer(xs, dtype=np.float64)
+    ys = np.frombuffer(ys, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    targets = np.asarray(targets, dtype=np.int64)
+    return (float(np.abs(xs[targets] - xs[sources]).max()), float(np.abs(ys[targets] - ys[sources]).max()))
+
+
+# KD-tree over node coordinates for nearest node lookups
+# The tree is implicit: order holds node indices so that the subtree over order[lo:hi]
+# is split at mid = (lo + hi) // 2 on x (even depth) or y (odd depth), with smaller
+# coordinates before mid. Ranges of LEAF_SIZE nodes or fewer are scanned directly.
+# x_scale stretches x before measuring, e.g. cos(latitude) for longitude/latitude data
+LEAF_SIZE = 8
+
+
+# Add node to the max heap of the k nearest if it is nearer than the farthest kept
+def keep_nearest(best: list, k: int, squared: float, node: int):
+    if len(best) < k:
+        heapq.heappush(best, (-squared, node))
+    elif squared < -best[0][0]:
+        heapq.heapreplace(best, (-squared, node))
+
+
+class KDTree:
+    def __init__(self, xs, ys, x_scale: float = 1.):
+        self.x_scale = x_scale
+        self.xs = array('d', (x * x_scale for x in xs))
+        self.ys = array('d', ys)
+        order = list(range(len(self.xs)))
+        stack = [(0, len(order), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            coords = self.ys if axis else self.xs
+            order[lo:hi] = sorted(order[lo:hi], key=coords.__getitem__)
+            mid = (lo + hi) // 2
+            stack.append((lo, mid, 1 - axis))
+            stack.append((mid + 1, hi, 1 - axis))
+        self.order = array('i', order)
+
+    # k nearest nodes to (x, y) as [(node index, distance)], nearest first
+    def k_nearest(self, x: float, y: float, k: int = 1) -> 'list[tuple[int, float]]':
+        x *= self.x_scale
+        xs, ys, order = self.xs, self.ys, self.order
+        # Max heap of the best k so far as (-squared distance, node)
+        best = []
+        # (lower bound on squared distance, lo, hi, axis), nearer halves are popped first
+        stack = [(0., 0, len(order), 0)]
+        while stack:
+            bound, lo, hi, axis = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                for node in order[lo:hi]:
+                    keep_nearest(best, k, (xs[node] - x) ** 2 + (ys[node] - y) ** 2, node)
+                continue
+            mid = (lo + hi) // 2
+            node = order[mid]
+            keep_nearest(best, k, (xs[node] - x) ** 2 + (ys[node] - y) ** 2, node)
+            diff = (y - ys[node]) if axis else (x - xs[node])
+            if diff < 0:
+                stack.append((max(bound, diff * diff), mid + 1, hi, 1 - axis))
+                stack.append((bound, lo, mid, 1 - axis))
+            else:
+                stack.append((max(bound, diff * diff), lo, mid, 1 - axis))
+                stack.append((bound, mid + 1, hi, 1 - axis))
+        return [(node, sqrt(-negative)) for negative, node in sorted(best, reverse=True)]
+
+    # Nearest node index to (x, y)
+    def nearest(self, x: float, y: float) -> int:
+        return self.k_nearest(x, y, 1)[0][0]
+
+    # Nearest node index to each of points, [[k nearest] for each point] when k > 1
+    def nearest_many(self, points, k: int = 1) -> list:
+        if k == 1:
+            return [self.nearest(x, y) for x, y in points]
+        return [[node for node, _ in self.k_nearest(x, y, k)] for x, y in points]
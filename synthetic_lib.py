@@ -0,0 +1,213 @@
+# Imports
+import argparse
+import os
+import time
+from array import array
+from math import ceil, sqrt
+
+from csr_lib import CSRGraph
+from pygame_lib import max_x, max_y, min_x, min_y
+from snapshot_lib import write_snapshot
+
+# Synthetic road networks in the G/Coord/Dist/Cost.json format (plus a snapshot)
+# The network is a perturbed grid of local streets inside the NYC map bounds used by
+# pygame_lib. Some streets are missing and some are one-way. Every few rows and
+# columns is a highway: its local segments are never removed, and express edges join
+# interchanges a few blocks apart in a straight line.
+#
+# Distances are coordinate distances times a curvature factor. Energy is distance
+# times a per-road rate (cheaper on highways) and a grade term, which is positive one
+# way and negative the other, so energy tracks distance without being proportional.
+#
+# Every random choice is a hash of (seed, segment), not a draw from one shared RNG.
+# Nodes can then be written one at a time, both directions of a street agree, and
+# memory stays flat for JSON output at any size (the snapshot needs the full arrays).
+MASK = (1 << 64) - 1
+# Keep coordinates inside the map bounds the visualiser scales to
+MIN_X, MAX_X, MIN_Y, MAX_Y = min_x, max_x, min_y, max_y
+
+MISSING_RATE = 0.05
+ONE_WAY_RATE = 0.15
+HIGHWAY_SPACING = 16
+INTERCHANGE_SPACING = 4
+JITTER = 0.3
+
+# Salts for independent random streams
+SALT_X, SALT_Y, SALT_MISSING, SALT_ONE_WAY, SALT_DIRECTION, SALT_CURVE, SALT_RATE, SALT_GRADE = range(8)
+
+
+# splitmix64 finaliser
+def mix(value: int) -> int:
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+# Uniform float in [0, 1) for (seed, salt, key)
+def unit(seed: int, salt: int, key: int) -> float:
+    return mix(mix((seed << 4) | salt) ^ key) / 18446744073709551616.
+
+
+class RoadNetwork:
+    def __init__(self, nodes: int, seed: int = 0, highway_spacing: int = HIGHWAY_SPACING,
+                 missing_rate: float = MISSING_RATE, one_way_rate: float = ONE_WAY_RATE):
+        self.cols = max(2, ceil(sqrt(nodes)))
+        self.rows = max(2, ceil(nodes / self.cols))
+        self.num_nodes = self.rows * self.cols
+        self.seed = seed
+        self.highway_spacing = highway_spacing
+        self.missing_rate = missing_rate
+        self.one_way_rate = one_way_rate
+        # Block size, with a margin of one block so jitter stays inside the bounds
+        self.dx = (MAX_X - MIN_X) / (self.cols + 1)
+        self.dy = (MAX_Y - MIN_Y) / (self.rows + 1)
+
+    # Node ids are 1-based like the NYC data, node (i, j) is row i, column j
+    def node_id(self, i: int, j: int) -> str:
+        return str(i * self.cols + j + 1)
+
+    def coordinates(self, i: int, j: int) -> 'tuple[int, int]':
+        key = i * self.cols + j
+        x = MIN_X + (j + 1 + JITTER * (2 * unit(self.seed, SALT_X, key) - 1)) * self.dx
+        y = MIN_Y + (i + 1 + JITTER * (2 * unit(self.seed, SALT_Y, key) - 1)) * self.dy
+        return (int(x), int(y))
+
+    def is_highway_row(self, i: int) -> bool:
+        return i % self.highway_spacing == 0
+
+    def is_highway_col(self, j: int) -> bool:
+        return j % self.highway_spacing == 0
+
+    # Street segment key: horizontal (i, j) - (i, j + 1) is even, vertical (i, j) - (i + 1, j) is odd
+    # Returns whether u -> v can be driven, where u is the lower node of the segment if forward
+    def segment_allows(self, key: int, highway: bool, forward: bool) -> bool:
+        if highway:
+            return True
+        if unit(self.seed, SALT_MISSING, key) < self.missing_rate:
+            return False
+        if unit(self.seed, SALT_ONE_WAY, key) < self.one_way_rate:
+            return (unit(self.seed, SALT_DIRECTION, key) < 0.5) == forward
+        return True
+
+    # (distance, energy) of u -> v, key identifies the road, forward its direction
+    def edge_values(self, u: 'tuple[int, int]', v: 'tuple[int, int]', key: int, highway: bool, forward: bool):
+        straight = sqrt((u[0] - v[0]) ** 2 + (u[1] - v[1]) ** 2)
+        if highway:
+            distance = straight * (1. + 0.02 * unit(self.seed, SALT_CURVE, key))
+            rate = 0.6 + 0.2 * unit(self.seed, SALT_RATE, key)
+        else:
+            distance = straight * (1. + 0.2 * unit(self.seed, SALT_CURVE, key))
+            rate = 0.9 + 0.6 * unit(self.seed, SALT_RATE, key)
+        grade = 0.3 * (2 * unit(self.seed, SALT_GRADE, key) - 1)
+        energy = distance * rate * (1. + (grade if forward else -grade))
+        return (round(distance, 3), round(energy, 1))
+
+    # Outgoing edges of (i, j) as [(target row, target column, distance, energy)]
+    def out_edges(self, i: int, j: int) -> 'list[tuple[int, int, float, float]]':
+        rows, cols = self.rows, self.cols
+        here = self.coordinates(i, j)
+        edges = []
+        # (neighbour row, neighbour column, segment key, highway, forward)
+        candidates = []
+        if j + 1 < cols:
+            candidates.append((i, j + 1, 2 * (i * cols + j), self.is_highway_row(i), True))
+        if i + 1 < rows:
+            candidates.append((i + 1, j, 2 * (i * cols + j) + 1, self.is_highway_col(j), True))
+        if j > 0:
+            candidates.append((i, j - 1, 2 * (i * cols + j - 1), self.is_highway_row(i), False))
+        if i > 0:
+            candidates.append((i - 1, j, 2 * ((i - 1) * cols + j) + 1, self.is_highway_col(j), False))
+        for a, b, key, highway, forward in candidates:
+            if self.segment_allows(key, highway, forward):
+                edges.append((a, b) + self.edge_values(here, self.coordinates(a, b), key, highway, forward))
+
+        # Express edges between interchanges along highway rows and columns
+        step = INTERCHANGE_SPACING
+        express = []
+        if self.is_highway_row(i) and j % step == 0:
+            express += [(i, j + step, True), (i, j - step, False)]
+        if self.is_highway_col(j) and i % step == 0:
+            express += [(i + step, j, True), (i - step, j, False)]
+        for a, b, forward in express:
+            if 0 <= a < rows and 0 <= b < cols:
+                # Keyed past the street segments, by the lower interchange and orientation
+                low = (i * cols + j) if forward else (a * cols + b)
+                key = 2 * rows * cols + 2 * low + (a != i)
+                edges.append((a, b) + self.edge_values(here, self.coordinates(a, b), key, True, forward))
+        return edges
+
+
+# Write the four JSON files node by node, optionally collecting a CSR graph for a snapshot
+def write_network(network: RoadNetwork, output_dir: str, snapshot: bool = True, progress: bool = True):
+    os.makedirs(output_dir, exist_ok=True)
+    files = {name: open(os.path.join(output_dir, f"{name}.json"), 'w') for name in ("G", "Coord", "Dist", "Cost")}
+    if snapshot:
+        offsets = array('i', [0])
+        targets = array('i')
+        dists = array('d')
+        costs = array('d')
+        xs = array('d')
+        ys = array('d')
+
+    start_time = time.time()
+    num_edges = 0
+    for file in files.values():
+        file.write("{")
+    for i in range(network.rows):
+        for j in range(network.cols):
+            node = network.node_id(i, j)
+            x, y = network.coordinates(i, j)
+            edges = network.out_edges(i, j)
+            separator = ", " if i or j else ""
+            adjacent = ", ".join(f'"{network.node_id(a, b)}"' for a, b, _, _ in edges)
+            files["G"].write(f'{separator}"{node}": [{adjacent}]')
+            files["Coord"].write(f'{separator}"{node}": [{x}, {y}]')
+            for a, b, distance, energy in edges:
+                edge_separator = ", " if num_edges else ""
+                key = f"{node},{network.node_id(a, b)}"
+                files["Dist"].write(f'{edge_separator}"{key}": {distance!r}')
+                files["Cost"].write(f'{edge_separator}"{key}": {energy!r}')
+                num_edges += 1
+                if snapshot:
+                    targets.append(a * network.cols + b)
+                    dists.append(distance)
+                    costs.append(energy)
+            if snapshot:
+                offsets.append(len(targets))
+                xs.append(x)
+                ys.append(y)
+        if progress and (i + 1) % max(1, network.rows // 20) == 0:
+            print(f"\rWriting rows: {100 * (i + 1) // network.rows}%", end="", flush=True)
+    for file in files.values():
+        file.write("}")
+        file.close()
+    if progress:
+        print()
+    print(f"Wrote {network.num_nodes} nodes, {num_edges} edges to {output_dir} in {round(time.time() - start_time, 2)} seconds")
+
+    if snapshot:
+        node_ids = [str(node) for node in range(1, network.num_nodes + 1)]
+        csr = CSRGraph(node_ids, offsets, targets, dists, costs, xs, ys, index={})
+        snapshot_file = os.path.join(output_dir, "graph.snap")
+        checksum = write_snapshot(csr, snapshot_file, output_dir)
+        print(f"Wrote {snapshot_file}, sha256 {checksum}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic road network in the G/Coord/Dist/Cost JSON format")
+    parser.add_argument("--nodes", type=int, default=10000, help="approximate node count, rounded up to a full grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="data/synthetic")
+    parser.add_argument("--highway-spacing", type=int, default=HIGHWAY_SPACING)
+    parser.add_argument("--missing-rate", type=float, default=MISSING_RATE)
+    parser.add_argument("--one-way-rate", type=float, default=ONE_WAY_RATE)
+    parser.add_argument("--no-snapshot", action="store_true", help="only write the JSON files")
+    args = parser.parse_args()
+
+    network = RoadNetwork(args.nodes, args.seed, args.highway_spacing, args.missing_rate, args.one_way_rate)
+    write_network(network, args.output_dir, not args.no_snapshot)
+    print(f"Load it with Graph(data_dir=\"{args.output_dir}\")")
+
+if __name__ == "__main__":
+    main()
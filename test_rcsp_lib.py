@@ -0,0 +1,74 @@
+# Imports
+import random
+from math import inf
+
+from csr_lib import CSRGraph
+from rcsp_lib import budget_limit, constrained_search
+from search_lib import search
+
+# constrained_search against an exhaustive search over every simple path of small
+# random graphs. Edge weights are multiples of 0.1, so energy sums depend on the
+# order they are added in, like the real data.
+
+
+# Random strongly connected-ish graph on num_nodes nodes as a CSRGraph
+def random_graph(rng: random.Random, num_nodes: int, extra_edges: int) -> CSRGraph:
+    nodes = [str(node) for node in range(num_nodes)]
+    edges = {(nodes[i], nodes[(i + 1) % num_nodes]) for i in range(num_nodes)}
+    while len(edges) < num_nodes + extra_edges:
+        u, v = rng.sample(nodes, 2)
+        edges.add((u, v))
+    adj_list = {node: [] for node in nodes}
+    dists, costs = {}, {}
+    for u, v in sorted(edges):
+        adj_list[u].append(v)
+        dists[f"{u},{v}"] = rng.randint(1, 30) * 0.1
+        costs[f"{u},{v}"] = rng.randint(1, 30) * 0.1
+    coords = {node: [0., 0.] for node in nodes}
+    return CSRGraph.from_dicts(adj_list, coords, dists, costs)
+
+
+# Shortest distance over simple paths whose energy (summed from the source) fits the budget
+def exhaustive_distance(csr: CSRGraph, source: int, target: int, budget: float) -> float:
+    best = inf
+    stack = [(source, [source])]
+    while stack:
+        node, path = stack.pop()
+        if node == target:
+            distance, cost = csr.path_totals(path)
+            if cost <= budget:
+                best = min(best, distance)
+            continue
+        for e in range(csr.offsets[node], csr.offsets[node + 1]):
+            adj_node = csr.targets[e]
+            if adj_node not in path:
+                stack.append((adj_node, path + [adj_node]))
+    return best
+
+
+def test_matches_exhaustive_pareto_search():
+    rng = random.Random(7)
+    for _ in range(40):
+        csr = random_graph(rng, rng.randint(4, 9), rng.randint(2, 14))
+        source, target = rng.sample(range(csr.num_nodes()), 2)
+        min_cost = search(csr, source, target, weights="costs").cost
+        for budget in (min_cost, min_cost + rng.random() * 2, min_cost - 0.05, inf):
+            expected = exhaustive_distance(csr, source, target, budget)
+            result = constrained_search(csr, source, target, budget)
+            if expected == inf:
+                assert not result.found()
+                continue
+            assert result.found()
+            assert abs(result.distance - expected) < 1e-9
+            assert result.cost <= budget_limit(budget)
+
+
+def test_budget_equal_to_minimum_energy_is_feasible():
+    rng = random.Random(11)
+    for _ in range(100):
+        csr = random_graph(rng, 12, 30)
+        source, target = rng.sample(range(csr.num_nodes()), 2)
+        minimum_energy = search(csr, source, target, weights="costs")
+        result = constrained_search(csr, source, target, minimum_energy.cost)
+        assert result.found()
+        assert result.distance <= minimum_energy.distance + 1e-9